@@ -7,26 +7,55 @@ import secrets
 from datetime import datetime
 from typing import Optional
 from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query, Form
-from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, raiseload
 
 from app.core.db import get_db
 from app.models import Event, Guest
 from app.schemas.event import EventCreate, EventResponse, EventDetail
 from app.schemas.guest import GuestUpdate, GuestResponse
+from app.services.cache import invalidate_summary
 from app.services.excel_service import ExcelService
+from app.services.qr_service import QRService
 from app.services.checkin_service import CheckInService
+from app.services.seating_service import SeatingService
 from app.api.ws import websocket_manager
 from app.utils.security import verify_admin_token
 from app.utils.responses import success_response, error_response, validation_error, not_found_error
-from fastapi.responses import Response
-from app.services.repositories import use_firestore, EventRepo
-from app.services.firebase_client import get_firestore_client
+from fastapi.responses import FileResponse
+from starlette.background import BackgroundTask
+from app.services.repositories import use_firestore, EventRepo, GuestRepo
 
 router = APIRouter()
 
 # Initialize check-in service
 checkin_service = CheckInService(websocket_manager)
 
+# Attempts at drawing a fresh public code before giving up on a collision
+PUBLIC_CODE_ATTEMPTS = 3
+
+def _create_event_sql(db: Session, name: str, date: datetime, organizer_email: str) -> Event:
+    """Insert an event, relying on the public_code UNIQUE constraint to detect collisions"""
+    for attempt in range(PUBLIC_CODE_ATTEMPTS):
+        event = Event(
+            name=name,
+            date=date,
+            organizer_email=organizer_email,
+            public_code=secrets.token_urlsafe(8)
+        )
+        db.add(event)
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            if attempt == PUBLIC_CODE_ATTEMPTS - 1:
+                raise
+            continue
+        db.refresh(event)
+        return event
+
 @router.post("/events", response_model=dict)
 async def create_event(
     event_data: EventCreate,
@@ -34,22 +63,13 @@ async def create_event(
     token: str = Depends(verify_admin_token)
 ):
     """Create a new event"""
-    # Generate unique public code
-    public_code = secrets.token_urlsafe(8)
-
     if not use_firestore():
-        while db.query(Event).filter(Event.public_code == public_code).first():
-            public_code = secrets.token_urlsafe(8)
-
-        event = Event(
+        event = _create_event_sql(
+            db,
             name=event_data.name,
             date=event_data.date,
-            organizer_email=event_data.organizer_email,
-            public_code=public_code
+            organizer_email=event_data.organizer_email
         )
-        db.add(event)
-        db.commit()
-        db.refresh(event)
 
         return success_response(
             message="Event created successfully",
@@ -68,7 +88,7 @@ async def create_event(
             name=event_data.name,
             date_iso=event_data.date.isoformat(),
             organizer_email=event_data.organizer_email,
-            public_code=public_code
+            public_code=secrets.token_urlsafe(8)
         )
         return success_response(
             message="Event created successfully",
@@ -85,20 +105,12 @@ async def get_event_details(
     token: str = Depends(verify_admin_token)
 ):
     """Get detailed event information"""
-    event = db.query(Event).filter(Event.id == event_id).first()
+    # Counts come from one aggregate query; never walk event.guests here
+    event = db.query(Event).options(raiseload("*")).filter(Event.id == event_id).first()
     if not event:
         raise not_found_error("Event")
     
-    # Get statistics
-    total_guests = db.query(Guest).filter(Guest.event_id == event_id).count()
-    checked_in_count = db.query(Guest).filter(
-        Guest.event_id == event_id,
-        Guest.checked_in == True
-    ).count()
-    
-    # Get unique tables
-    tables = db.query(Guest.table_name).filter(Guest.event_id == event_id).distinct().all()
-    total_tables = len(tables)
+    total_guests, total_tables, checked_in_count = EventRepo.get_detail_counts_sql(db, event_id)
     
     return success_response(
         message="Event details retrieved",
@@ -119,15 +131,23 @@ async def get_event_details(
 async def upload_excel(
     event_id: int,
     file: UploadFile = File(...),
+    public_code: Optional[str] = Query(None),
     db: Session = Depends(get_db),
     token: str = Depends(verify_admin_token)
 ):
-    """Upload and process Excel file"""
+    """Upload and process Excel file.
+
+    Firestore events have no numeric id, so in Firestore mode the event is
+    identified by the public_code query parameter instead.
+    """
     # Verify event exists
     if not use_firestore():
         event = db.query(Event).filter(Event.id == event_id).first()
         if not event:
             raise not_found_error("Event")
+        public_code = event.public_code
+    elif not public_code or not EventRepo.get_by_public_code_fs(public_code):
+        raise not_found_error("Event")
     
     # Validate file type
     if not file.filename.endswith(('.xlsx', '.xls')):
@@ -136,28 +156,22 @@ async def upload_excel(
             status_code=400
         )
     
-    # Read file content
-    file_content = await file.read()
-    
     if not use_firestore():
-        ExcelService.save_original_file(file_content, event_id)
-        success, errors, processed_count = ExcelService.process_excel_upload(
-            file_content=file_content,
+        # Stream the upload to its final location, then parse it from disk
+        # in the threadpool so the event loop keeps serving other requests
+        file_path = await run_in_threadpool(ExcelService.save_original_upload, file.file, event_id)
+        success, errors, processed_count = await run_in_threadpool(
+            ExcelService.process_excel_path,
+            file_path=file_path,
             event_id=event_id,
             db=db
         )
     else:
-        # Parse into records and write to Firestore
-        ok, errors, records = ExcelService.parse_excel_to_records(file_content)
-        if not ok:
-            return error_response(message="Excel file validation failed", details=errors, status_code=422)
-        fs = get_firestore_client()
-        batch = fs.batch()
-        # event_id in SQL path is numeric; for Firestore we require public_code route normally.
-        # Here we look up event by numeric id is not applicable; this upload endpoint should be used by create-event-with-excel.
-        # We'll assume `event_id` maps to SQL. For Firestore, prefer the combined endpoint below.
-        processed_count = 0
-        # No-op because we cannot resolve public_code from event_id here in Firestore mode.
+        file_content = await file.read()
+        success, errors, records = await run_in_threadpool(ExcelService.parse_excel_to_records, file_content)
+        if success:
+            await run_in_threadpool(GuestRepo.replace_guests_fs, public_code, records)
+        processed_count = len(records)
     
     if not success:
         return error_response(
@@ -166,11 +180,12 @@ async def upload_excel(
             status_code=422
         )
     
-    if not use_firestore():
-        await checkin_service.broadcast_seating_update(
-            public_code=event.public_code,
-            update_type="seating_uploaded"
-        )
+    EventRepo.invalidate_public_code(public_code)
+    await invalidate_summary(public_code)
+    await checkin_service.broadcast_seating_update(
+        public_code=public_code,
+        update_type="seating_uploaded"
+    )
     
     return success_response(
         message=f"Excel file processed successfully. {processed_count} guests imported.",
@@ -200,14 +215,11 @@ async def export_original_excel(
             status_code=404
         )
     
-    # Read and return file
-    with open(file_path, 'rb') as f:
-        file_content = f.read()
-    
-    return Response(
-        content=file_content,
+    # Served with sendfile where available, without copying through Python
+    return FileResponse(
+        file_path,
         media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f"attachment; filename=original_{event.public_code}.xlsx"}
+        filename=f"original_{event.public_code}.xlsx"
     )
 
 @router.get("/events/{event_id}/export/updated.xlsx")
@@ -222,40 +234,53 @@ async def export_updated_excel(
     if not event:
         raise not_found_error("Event")
     
-    # Export current data
-    excel_content = ExcelService.export_current_data(event_id, db, include_checkin=True)
+    # Build the workbook on disk in the threadpool, then serve the file and
+    # remove it once sent
+    file_path = await run_in_threadpool(ExcelService.export_current_data_file, event_id, db, True)
     
-    return Response(
-        content=excel_content,
+    return FileResponse(
+        file_path,
         media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f"attachment; filename=current_seating_{event.public_code}.xlsx"}
+        filename=f"current_seating_{event.public_code}.xlsx",
+        background=BackgroundTask(os.remove, file_path)
     )
 
 @router.get("/events/{event_id}/guests")
 async def search_guests(
     event_id: int,
     search: Optional[str] = Query(None),
-    page: int = Query(1, ge=1),
+    after_name: Optional[str] = Query(None),
+    after_id: Optional[int] = Query(None),
     per_page: int = Query(50, ge=1, le=100),
+    include_total: bool = Query(False),
     db: Session = Depends(get_db),
     token: str = Depends(verify_admin_token)
 ):
-    """Search and list guests for an event"""
+    """Search and list guests for an event (keyset paginated on name, id)"""
     if not use_firestore():
         event = db.query(Event).filter(Event.id == event_id).first()
         if not event:
             raise not_found_error("Event")
     
     # Build query
-    query = db.query(Guest).filter(Guest.event_id == event_id)
-    
     if search:
-        query = query.filter(Guest.name.ilike(f"%{search}%"))
+        query = SeatingService.search_names(event_id, search, db)
+    else:
+        query = db.query(Guest).filter(Guest.event_id == event_id)
+    
+    # Exact totals are opt-in; count without ORDER BY or row columns
+    total = None
+    if include_total:
+        total = query.order_by(None).with_entities(func.count(Guest.id)).scalar()
+    
+    # Seek past the last row of the previous page instead of OFFSET scanning
+    if after_name is not None and after_id is not None:
+        query = query.filter(tuple_(Guest.name, Guest.id) > tuple_(after_name, after_id))
     
-    # Pagination
-    offset = (page - 1) * per_page
-    guests = query.offset(offset).limit(per_page).all()
-    total = query.count()
+    # Fetch one extra row to detect a next page without a COUNT query
+    guests = query.order_by(Guest.name.asc(), Guest.id.asc()).limit(per_page + 1).all()
+    has_next = len(guests) > per_page
+    guests = guests[:per_page]
     
     guest_data = [
         {
@@ -270,15 +295,20 @@ async def search_guests(
         for guest in guests
     ]
     
+    next_cursor = None
+    if has_next:
+        last = guests[-1]
+        next_cursor = {"name": last.name, "id": last.id}
+    
     return success_response(
         message="Guests retrieved successfully",
         data={
             "guests": guest_data,
             "pagination": {
-                "page": page,
                 "per_page": per_page,
-                "total": total,
-                "pages": (total + per_page - 1) // per_page
+                "has_next": has_next,
+                "next_cursor": next_cursor,
+                "total": total
             }
         }
     )
@@ -308,20 +338,23 @@ async def update_guest(
     # Validate updates
     errors = []
     
-    if guest_update.table_name and guest_update.table_name != guest.table_name:
-        from app.services.seating_service import SeatingService
-        if not SeatingService.validate_table_capacity(
-            event_id, guest_update.table_name, guest.id, db
-        ):
-            errors.append(f"Table '{guest_update.table_name}' would exceed maximum capacity of 12 guests")
-    
-    if guest_update.seat_no and guest_update.seat_no != guest.seat_no:
-        table_name = guest_update.table_name or guest.table_name
-        from app.services.seating_service import SeatingService
-        if not SeatingService.validate_seat_uniqueness(
-            event_id, table_name, guest_update.seat_no, guest.id, db
-        ):
-            errors.append(f"Seat {guest_update.seat_no} is already taken in table '{table_name}'")
+    table_changed = bool(guest_update.table_name) and guest_update.table_name != guest.table_name
+    seat_changed = bool(guest_update.seat_no) and guest_update.seat_no != guest.seat_no
+    
+    table_name = guest_update.table_name or guest.table_name
+    seat_no = guest_update.seat_no or guest.seat_no
+    seat_taken_error = f"Seat {seat_no} is already taken in table '{table_name}'"
+    
+    if table_changed or seat_changed:
+        capacity_ok, seat_unique = SeatingService.validate_placement(
+            event_id, table_name, seat_no, guest.id, db
+        )
+        
+        if table_changed and not capacity_ok:
+            errors.append(f"Table '{table_name}' would exceed maximum capacity of 12 guests")
+        
+        if not seat_unique:
+            errors.append(seat_taken_error)
     
     if errors:
         return error_response(
@@ -342,10 +375,18 @@ async def update_guest(
     if guest_update.checked_in is not None:
         guest.checked_in = guest_update.checked_in
     
-    guest.updated_at = datetime.utcnow()
-    
-    db.commit()
+    # The seat UNIQUE constraint catches a concurrent move into the same seat
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return error_response(
+            message="Validation failed",
+            details=[seat_taken_error],
+            status_code=422
+        )
     db.refresh(guest)
+    await invalidate_summary(event.public_code)
     
     # Broadcast update
     await checkin_service.broadcast_guest_update(
@@ -389,28 +430,19 @@ async def create_event_with_excel(
         # Parse date
         event_date = datetime.fromisoformat(date.replace('Z', '+00:00'))
         
-        # Generate unique public code
-        public_code = secrets.token_urlsafe(8)
         if not use_firestore():
-            while db.query(Event).filter(Event.public_code == public_code).first():
-                public_code = secrets.token_urlsafe(8)
-
-            event = Event(
+            event = _create_event_sql(
+                db,
                 name=name,
                 date=event_date,
-                organizer_email=organizer_email,
-                public_code=public_code
+                organizer_email=organizer_email
             )
             
-            db.add(event)
-            db.commit()
-            db.refresh(event)
-            
             # Process Excel file
-            file_content = await file.read()
-            ExcelService.save_original_file(file_content, event.id)
-            success, errors, processed_count = ExcelService.process_excel_upload(
-                file_content=file_content,
+            file_path = await run_in_threadpool(ExcelService.save_original_upload, file.file, event.id)
+            success, errors, processed_count = await run_in_threadpool(
+                ExcelService.process_excel_path,
+                file_path=file_path,
                 event_id=event.id,
                 db=db
             )
@@ -444,6 +476,7 @@ async def create_event_with_excel(
             )
         else:
             # Firestore path
+            public_code = secrets.token_urlsafe(8)
             fs_event = EventRepo.create_fs(
                 name=name,
                 date_iso=event_date.isoformat(),
@@ -452,17 +485,11 @@ async def create_event_with_excel(
             )
 
             file_content = await file.read()
-            ok, errors, records = ExcelService.parse_excel_to_records(file_content)
+            ok, errors, records = await run_in_threadpool(ExcelService.parse_excel_to_records, file_content)
             if not ok:
                 return error_response(message="Excel file validation failed", details=errors, status_code=422)
 
-            fs = get_firestore_client()
-            batch = fs.batch()
-            guests_col = fs.collection("events").document(public_code).collection("guests")
-            for rec in records:
-                doc_ref = guests_col.document()
-                batch.set(doc_ref, rec)
-            batch.commit()
+            await run_in_threadpool(GuestRepo.add_guests_fs, public_code, records)
 
             await checkin_service.broadcast_seating_update(public_code=public_code, update_type="event_created")
 
@@ -496,6 +523,9 @@ async def delete_event(
     # Delete all related data (cascade should handle this)
     db.delete(event)
     db.commit()
+    EventRepo.invalidate_public_code(event.public_code)
+    await invalidate_summary(event.public_code)
+    await run_in_threadpool(QRService.remove_cached_qr, event.public_code)
     
     return success_response(
         message="Event deleted successfully",
@@ -3,6 +3,7 @@ Guest-facing API routes
 """
 
 from fastapi import APIRouter, Depends, Request, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
 from app.core.db import get_db
@@ -27,11 +28,12 @@ async def lookup_guest(
     """Look up guest seating information"""
     # Rate limiting
     client_ip = get_client_ip(request)
-    if not rate_limit_check(client_ip):
+    if not await rate_limit_check(client_ip):
         return rate_limit_error()
     
     # Get seating info
-    seating_info = SeatingService.get_guest_seating_info(
+    seating_info = await run_in_threadpool(
+        SeatingService.get_guest_seating_info,
         public_code=lookup_data.public_code,
         guest_name=lookup_data.name,
         db=db
@@ -45,7 +47,7 @@ async def lookup_guest(
     
     return success_response(
         message="Guest information found",
-        data=seating_info.dict()
+        data=seating_info.model_dump()
     )
 
 @router.post("/checkin")
@@ -57,7 +59,7 @@ async def check_in_guest(
     """Check in a guest and broadcast update"""
     # Rate limiting
     client_ip = get_client_ip(request)
-    if not rate_limit_check(client_ip):
+    if not await rate_limit_check(client_ip):
         return rate_limit_error()
     
     # Check in guest
@@ -3,16 +3,19 @@ Public API routes - no authentication required
 """
 
 from fastapi import APIRouter, Depends, Request, HTTPException
-from fastapi.responses import Response, JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, JSONResponse, FileResponse, StreamingResponse
+import orjson
 from sqlalchemy.orm import Session
 
 from app.core.db import get_db
 from app.models import Event
+from app.services.cache import SUMMARY_CACHE_TTL_SECONDS, get_or_set, summary_key
 from app.services.excel_service import ExcelService
 from app.services.qr_service import QRService
 from app.services.seating_service import SeatingService
-from app.utils.security import rate_limit_check, get_client_ip
-from app.utils.responses import success_response, error_response, rate_limit_error
+from app.utils.security import rate_limit_check, get_client_ip, is_admin_token
+from app.utils.responses import error_response, rate_limit_error
 from app.services.repositories import EventRepo, use_firestore
 
 router = APIRouter()
@@ -49,18 +52,25 @@ async def get_qr_code(
     db: Session = Depends(get_db)
 ):
     """Get QR code image for event"""
+    # Only real events get an image written to disk
     if not use_firestore():
-        event = db.query(Event).filter(Event.public_code == public_code).first()
-        if not event:
-            raise HTTPException(status_code=404, detail="Event not found")
+        event = EventRepo.get_ref_by_public_code_sql(db, public_code)
+    else:
+        event = await run_in_threadpool(EventRepo.get_by_public_code_fs, public_code)
+    if not event:
+        raise HTTPException(status_code=404, detail="Event not found")
     
-    # Generate QR code
-    qr_bytes = QRService.generate_event_qr(public_code)
+    # QR images are deterministic per code and URL, so generate once and serve from disk
+    qr_path = await run_in_threadpool(QRService.get_cached_qr_path, public_code)
     
-    return Response(
-        content=qr_bytes,
+    # Not immutable: the image changes if BASE_URL does; FileResponse's ETag revalidates
+    return FileResponse(
+        qr_path,
         media_type="image/png",
-        headers={"Content-Disposition": f"inline; filename=qr_{public_code}.png"}
+        headers={
+            "Content-Disposition": f"inline; filename=qr_{public_code}.png",
+            "Cache-Control": "public, max-age=86400"
+        }
     )
 
 @router.get("/template/wedding_seating_template.xlsx")
@@ -86,26 +96,40 @@ async def get_seating_summary(
     """Get public seating summary"""
     # Rate limiting for public access
     client_ip = get_client_ip(request)
-    if not rate_limit_check(client_ip):
+    if not await rate_limit_check(client_ip):
         raise rate_limit_error()
     
     # Check if names should be included (admin only)
-    if include_names:
-        from app.core.config import settings
-        if admin_token != settings.ADMIN_TOKEN:
-            include_names = False
+    if include_names and not is_admin_token(admin_token):
+        include_names = False
     
-    # Get seating summary
-    summary = SeatingService.get_seating_summary(
-        public_code=public_code,
-        db=db,
-        include_names=include_names
-    )
+    # Named summaries of large events stream table by table instead of
+    # building the whole document first
+    if include_names and not use_firestore():
+        chunks = await run_in_threadpool(SeatingService.stream_seating_summary, public_code, db)
+        if chunks is None:
+            raise HTTPException(status_code=404, detail="Event not found")
+        return StreamingResponse(chunks, media_type="application/json")
+    
+    async def build_response():
+        summary = await run_in_threadpool(
+            SeatingService.get_seating_summary,
+            public_code=public_code,
+            db=db,
+            include_names=include_names
+        )
+        if summary is None:
+            return None
+        return {"success": True, "message": "Seating summary retrieved successfully", "data": summary}
     
-    if summary is None:
+    # The anonymous summary is the hottest read; serve it from Redis when configured
+    if include_names:
+        body = await build_response()
+        payload = None if body is None else orjson.dumps(body, default=str)
+    else:
+        payload = await get_or_set(summary_key(public_code), SUMMARY_CACHE_TTL_SECONDS, build_response)
+    
+    if payload is None:
         raise HTTPException(status_code=404, detail="Event not found")
     
-    return success_response(
-        message="Seating summary retrieved successfully",
-        data=summary
-    )
+    return Response(content=payload, media_type="application/json")
@@ -2,80 +2,136 @@
 WebSocket manager for real-time updates
 """
 
-import json
+import asyncio
 import logging
-from typing import Dict, List
+from typing import Dict, Set
+
+import orjson
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
 from sqlalchemy.orm import Session
 
 from app.core.db import get_db
-from app.models import Event
 from app.services.repositories import EventRepo, use_firestore
 
 logger = logging.getLogger(__name__)
 
+# Messages buffered per connection before a slow client is dropped
+SEND_QUEUE_SIZE = 64
+
 class WebSocketManager:
     """Manages WebSocket connections for real-time updates"""
     
     def __init__(self):
-        # event_code -> list of websockets
-        self.active_connections: Dict[str, List[WebSocket]] = {}
+        # event_code -> set of websockets
+        self.active_connections: Dict[str, Set[WebSocket]] = {}
+        # websocket -> outgoing frames, drained by one writer task per connection
+        self._send_queues: Dict[WebSocket, asyncio.Queue] = {}
+        self._writers: Dict[WebSocket, asyncio.Task] = {}
+        # websocket -> event_code it joined, for direct sends
+        self._rooms: Dict[WebSocket, str] = {}
     
     async def connect(self, websocket: WebSocket, event_code: str):
         """Accept WebSocket connection and add to event room"""
         await websocket.accept()
         
         if event_code not in self.active_connections:
-            self.active_connections[event_code] = []
+            self.active_connections[event_code] = set()
         
-        self.active_connections[event_code].append(websocket)
+        self.active_connections[event_code].add(websocket)
+        queue = asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
+        self._send_queues[websocket] = queue
+        self._rooms[websocket] = event_code
+        self._writers[websocket] = asyncio.create_task(self._write_loop(websocket, event_code, queue))
         logger.info(f"WebSocket connected to event {event_code}. Total connections: {len(self.active_connections[event_code])}")
     
     def disconnect(self, websocket: WebSocket, event_code: str):
         """Remove WebSocket connection from event room"""
-        if event_code in self.active_connections:
-            try:
-                self.active_connections[event_code].remove(websocket)
-                logger.info(f"WebSocket disconnected from event {event_code}. Remaining connections: {len(self.active_connections[event_code])}")
-                
-                # Clean up empty rooms
-                if not self.active_connections[event_code]:
-                    del self.active_connections[event_code]
-            except ValueError:
-                # WebSocket was not in the list
-                pass
+        self._send_queues.pop(websocket, None)
+        self._rooms.pop(websocket, None)
+        writer = self._writers.pop(websocket, None)
+        if writer is not None and writer is not asyncio.current_task():
+            writer.cancel()
+        
+        connections = self.active_connections.get(event_code)
+        if connections is not None and websocket in connections:
+            connections.discard(websocket)
+            logger.info(f"WebSocket disconnected from event {event_code}. Remaining connections: {len(connections)}")
+            
+            # Clean up empty rooms
+            if not connections:
+                del self.active_connections[event_code]
+    
+    async def _write_loop(self, websocket: WebSocket, event_code: str, queue: asyncio.Queue):
+        """Send queued frames to one client, in order, until it fails or disconnects"""
+        try:
+            while True:
+                payload = await queue.get()
+                await websocket.send_text(payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error sending to websocket: {e}")
+            self.disconnect(websocket, event_code)
+    
+    def _enqueue(self, websocket: WebSocket, event_code: str, payload: str) -> bool:
+        """Queue a frame for a client, dropping the client if its buffer is full"""
+        queue = self._send_queues.get(websocket)
+        if queue is None:
+            return False
+        try:
+            queue.put_nowait(payload)
+            return True
+        except asyncio.QueueFull:
+            logger.warning(f"Dropping slow WebSocket client for event {event_code}")
+            self.disconnect(websocket, event_code)
+            asyncio.create_task(self._close_quietly(websocket))
+            return False
+    
+    @staticmethod
+    async def _close_quietly(websocket: WebSocket):
+        """Close a dropped client without surfacing transport errors"""
+        try:
+            await websocket.close(code=1013, reason="Client too slow")
+        except Exception:
+            pass
     
     async def send_personal_message(self, message: dict, websocket: WebSocket):
         """Send message to specific WebSocket"""
+        payload = orjson.dumps(message).decode()
+        
+        # Go through the writer when there is one so frames stay ordered
+        event_code = self._rooms.get(websocket)
+        if event_code is not None:
+            self._enqueue(websocket, event_code, payload)
+            return
+        
         try:
-            await websocket.send_text(json.dumps(message))
+            await websocket.send_text(payload)
         except Exception as e:
             logger.error(f"Error sending personal message: {e}")
     
     async def broadcast_to_event(self, event_code: str, message: dict):
         """Broadcast message to all WebSockets connected to an event"""
+        # Serialize once for every recipient
+        await self.broadcast_bytes_to_event(event_code, orjson.dumps(message))
+    
+    async def broadcast_bytes_to_event(self, event_code: str, payload_bytes: bytes):
+        """Broadcast an already-serialized JSON message to an event"""
         if event_code not in self.active_connections:
             logger.warning(f"No active connections for event {event_code}")
             return
         
-        # Create list copy to avoid modification during iteration
-        connections = self.active_connections[event_code].copy()
+        # Clients parse text frames, so decode once and send the same str to everyone
+        payload = payload_bytes.decode()
         
-        disconnected = []
-        for websocket in connections:
-            try:
-                await websocket.send_text(json.dumps(message))
-            except Exception as e:
-                logger.error(f"Error broadcasting to websocket: {e}")
-                disconnected.append(websocket)
-        
-        # Clean up disconnected websockets
-        for websocket in disconnected:
-            self.disconnect(websocket, event_code)
+        # Hand the frame to each client's writer; a slow client only fills its
+        # own queue and is dropped instead of stalling the fan-out
+        for websocket in tuple(self.active_connections[event_code]):
+            self._enqueue(websocket, event_code, payload)
     
     def get_connection_count(self, event_code: str) -> int:
         """Get number of active connections for an event"""
-        return len(self.active_connections.get(event_code, []))
+        return len(self.active_connections.get(event_code, ()))
     
     def get_all_connection_counts(self) -> Dict[str, int]:
         """Get connection counts for all events"""
@@ -100,7 +156,7 @@ async def websocket_endpoint(
     
     # Verify event exists (SQL or Firestore)
     if not use_firestore():
-        event = db.query(Event).filter(Event.public_code == event_code).first()
+        event = EventRepo.get_ref_by_public_code_sql(db, event_code)
         if not event:
             await websocket.close(code=4004, reason="Event not found")
             return
@@ -131,20 +187,24 @@ async def websocket_endpoint(
                 # Wait for messages from client (heartbeat, etc.)
                 data = await websocket.receive_text()
                 
-                # Parse and handle client messages if needed
-                try:
-                    client_message = json.loads(data)
-                    
-                    # Handle heartbeat/ping
-                    if client_message.get("type") == "ping":
-                        pong_message = {
-                            "type": "pong",
-                            "timestamp": client_message.get("timestamp")
-                        }
-                        await websocket_manager.send_personal_message(pong_message, websocket)
+                # Heartbeats are the only client messages handled, so skip
+                # parsing frames that can't be one
+                if '"ping"' not in data[:32]:
+                    continue
                 
-                except json.JSONDecodeError:
+                try:
+                    client_message = orjson.loads(data)
+                except orjson.JSONDecodeError:
                     logger.warning(f"Invalid JSON received from WebSocket: {data}")
+                    continue
+                
+                # Handle heartbeat/ping
+                if client_message.get("type") == "ping":
+                    pong_message = {
+                        "type": "pong",
+                        "timestamp": client_message.get("timestamp")
+                    }
+                    await websocket_manager.send_personal_message(pong_message, websocket)
                     
             except WebSocketDisconnect:
                 break
@@ -3,6 +3,7 @@ Configuration settings for the application
 """
 
 import os
+from functools import lru_cache
 from typing import List
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -40,4 +41,22 @@ class Settings(BaseSettings):
     # Rate limiting
     RATE_LIMIT_PER_MINUTE: int = 30
     
-settings = Settings()
+    # Reverse proxies in front of the app that append to X-Forwarded-For;
+    # 0 ignores forwarding headers and uses the peer address
+    TRUSTED_PROXY_HOPS: int = int(os.getenv("TRUSTED_PROXY_HOPS", "1"))
+    
+    # Shared state across workers: rate limits and the seating summary cache.
+    # When unset, rate limits are per process and summaries are not cached
+    REDIS_URL: str | None = os.getenv("REDIS_URL")
+    
+    # Create tables and run column backfills at startup; turn off where a
+    # deploy step owns the schema so replicas skip the catalog probes
+    AUTO_CREATE_SCHEMA: bool = os.getenv("AUTO_CREATE_SCHEMA", "true").lower() in ("1", "true", "yes")
+    
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Return the process-wide settings, reading the environment only once"""
+    return Settings()
+
+settings = get_settings()
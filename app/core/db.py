@@ -2,9 +2,11 @@
 Database configuration and session management
 """
 
-from sqlalchemy import create_engine
+from sqlalchemy import DateTime, create_engine, event
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.sql.expression import FunctionElement
 
 from app.core.config import settings
 
@@ -14,12 +16,38 @@ engine = create_engine(
     connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {}
 )
 
+# File-backed SQLite: WAL lets readers proceed during check-in writes, and
+# with WAL, synchronous=NORMAL only fsyncs at checkpoints
+if engine.dialect.name == "sqlite" and engine.url.database not in (None, "", ":memory:"):
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.close()
+
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # Create base class for models
 Base = declarative_base()
 
+class utcnow(FunctionElement):
+    """Database clock in UTC, as a naive timestamp to match the DateTime columns"""
+    type = DateTime()
+    inherit_cache = True
+
+@compiles(utcnow)
+def _utcnow_default(element, compiler, **kw):
+    # SQLite's CURRENT_TIMESTAMP is already UTC
+    return "CURRENT_TIMESTAMP"
+
+@compiles(utcnow, "postgresql")
+def _utcnow_postgresql(element, compiler, **kw):
+    # now() follows the session time zone; convert before dropping the offset
+    return "TIMEZONE('utc', CURRENT_TIMESTAMP)"
+
 def get_db():
     """Dependency to get database session"""
     db = SessionLocal()
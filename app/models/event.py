@@ -2,11 +2,10 @@
 Event model
 """
 
-from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import Column, Integer, String, DateTime, JSON
 from sqlalchemy.orm import relationship
 
-from app.core.db import Base
+from app.core.db import Base, utcnow
 
 class Event(Base):
     __tablename__ = "events"
@@ -16,7 +15,16 @@ class Event(Base):
     date = Column(DateTime, nullable=False)
     organizer_email = Column(String(255), nullable=False)
     public_code = Column(String(50), unique=True, nullable=False, index=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=utcnow())
+    
+    # Denormalized guest counters, kept in step by app.models.guest
+    total_guests = Column(Integer, default=0, nullable=False)
+    checked_in_count = Column(Integer, default=0, nullable=False)
+    
+    # Per-table summary snapshot, rebuilt by each guest write in the same
+    # transaction; only trusted while its version matches tables_version
+    tables_version = Column(Integer, default=0, nullable=False)
+    tables_cache = Column(JSON, nullable=True)
     
     # Relationships
     tables = relationship("Table", back_populates="event", cascade="all, delete-orphan")
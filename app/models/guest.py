@@ -2,11 +2,17 @@
 Guest model
 """
 
-from datetime import datetime
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey
-from sqlalchemy.orm import relationship
+import logging
+import weakref
 
-from app.core.db import Base
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Index, UniqueConstraint, DDL, event, inspect, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, column_property, relationship, validates
+
+from app.core.db import Base, utcnow
+from app.models.event import Event
+
+logger = logging.getLogger(__name__)
 
 class Guest(Base):
     __tablename__ = "guests"
@@ -14,11 +20,155 @@ class Guest(Base):
     id = Column(Integer, primary_key=True, index=True)
     event_id = Column(Integer, ForeignKey("events.id"), nullable=False)
     name = Column(String(255), nullable=False)
+    name_lower = Column(String(255))  # lower(name), set whenever name is assigned
     table_name = Column(String(100), nullable=False)
     seat_no = Column(Integer, nullable=False)
     dietary = Column(String(255), default="none")  # none, vegetarian, halal, allergies:<text>
-    checked_in = Column(Boolean, default=False)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # active_history loads the old value on assignment, so the counter hook
+    # sees a real before/after even when the instance was expired
+    checked_in = column_property(Column(Boolean, default=False), active_history=True)
+    updated_at = Column(DateTime, default=utcnow(), onupdate=utcnow())
     
     # Relationships
     event = relationship("Event", back_populates="guests")
+    
+    __table_args__ = (
+        # Backs keyset pagination and (event_id, name) lookups
+        Index("ix_guests_event_name_id", "event_id", "name", "id"),
+        # Backs name lookups within an event
+        Index(
+            "ix_guests_event_name_lower",
+            "event_id",
+            "name_lower",
+            postgresql_ops={"name_lower": "text_pattern_ops"}
+        ),
+        # Backs per-event and per-table checked-in counts; partial, so it only
+        # holds guests who have arrived
+        Index(
+            "ix_guests_event_table_checked_in",
+            "event_id",
+            "table_name",
+            postgresql_where=text("checked_in = true"),
+            sqlite_where=text("checked_in = 1")
+        ),
+        # One guest per seat; its index also backs per-table listings and capacity checks
+        UniqueConstraint("event_id", "table_name", "seat_no", name="uq_guests_event_table_seat"),
+        # Lets Postgres answer LIKE '%term%' name searches from an index
+        Index(
+            "ix_guests_name_lower_trgm",
+            "name_lower",
+            postgresql_using="gin",
+            postgresql_ops={"name_lower": "gin_trgm_ops"}
+        ).ddl_if(dialect="postgresql"),
+    )
+    
+    @validates("name")
+    def _set_name_lower(self, key, name):
+        """Keep name_lower in step with name so lookups never lower() per row"""
+        self.name_lower = name.lower() if name is not None else None
+        return name
+
+# -------- Event counters --------
+
+@event.listens_for(Session, "after_flush")
+def _update_event_counters(session, flush_context):
+    """Apply ORM guest inserts, deletes and check-in changes to Event's counters
+    and bump its tables_version, which retires the per-table summary snapshot.
+
+    Bulk statements bypass the session; their callers adjust the counters directly.
+    """
+    deltas = {}
+
+    def add(event_id, guests, checked_in):
+        total, checked = deltas.get(event_id, (0, 0))
+        deltas[event_id] = (total + guests, checked + checked_in)
+
+    for obj in session.new:
+        if isinstance(obj, Guest):
+            add(obj.event_id, 1, int(bool(obj.checked_in)))
+    for obj in session.deleted:
+        if isinstance(obj, Guest):
+            add(obj.event_id, -1, -int(bool(obj.checked_in)))
+    for obj in session.dirty:
+        if isinstance(obj, Guest):
+            state = inspect(obj)
+            history = state.attrs.checked_in.history
+            if history.added:
+                was = bool(history.deleted[0]) if history.deleted else False
+                add(obj.event_id, 0, int(bool(history.added[0])) - int(was))
+            elif state.attrs.table_name.history.has_changes():
+                add(obj.event_id, 0, 0)
+
+    # Counters on events deleted in this flush no longer matter
+    deleted_events = {obj.id for obj in session.deleted if isinstance(obj, Event)}
+    for event_id, (guests, checked_in) in deltas.items():
+        if event_id in deleted_events:
+            continue
+        session.execute(
+            Event.__table__.update()
+            .where(Event.__table__.c.id == event_id)
+            .values(
+                total_guests=Event.__table__.c.total_guests + guests,
+                checked_in_count=Event.__table__.c.checked_in_count + checked_in,
+                tables_version=Event.__table__.c.tables_version + 1
+            )
+        )
+
+# -------- Name search index --------
+
+# SQLite has no trigram operator class, so name search is backed by an
+# external-content FTS5 table using the trigram tokenizer, which keeps
+# substring semantics. Triggers keep it in sync with the guests table.
+GUEST_FTS_TABLE = "guests_fts"
+
+_SQLITE_FTS_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {GUEST_FTS_TABLE} USING fts5("
+    "name, content='guests', content_rowid='id', tokenize='trigram')",
+    f"CREATE TRIGGER IF NOT EXISTS guests_fts_ai AFTER INSERT ON guests BEGIN "
+    f"INSERT INTO {GUEST_FTS_TABLE}(rowid, name) VALUES (new.id, new.name); END",
+    f"CREATE TRIGGER IF NOT EXISTS guests_fts_ad AFTER DELETE ON guests BEGIN "
+    f"INSERT INTO {GUEST_FTS_TABLE}({GUEST_FTS_TABLE}, rowid, name) VALUES ('delete', old.id, old.name); END",
+    f"CREATE TRIGGER IF NOT EXISTS guests_fts_au AFTER UPDATE OF name ON guests BEGIN "
+    f"INSERT INTO {GUEST_FTS_TABLE}({GUEST_FTS_TABLE}, rowid, name) VALUES ('delete', old.id, old.name); "
+    f"INSERT INTO {GUEST_FTS_TABLE}(rowid, name) VALUES (new.id, new.name); END",
+]
+
+# engine -> whether the FTS table exists
+_fts_available = weakref.WeakKeyDictionary()
+
+event.listen(
+    Guest.__table__,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql")
+)
+
+@event.listens_for(Guest.__table__, "after_create")
+def _create_name_search_index(target, connection, **kw):
+    """Create the SQLite FTS5 name index alongside the guests table"""
+    if connection.dialect.name != "sqlite":
+        return
+    _fts_available.pop(connection.engine, None)
+    try:
+        for statement in _SQLITE_FTS_DDL:
+            connection.exec_driver_sql(statement)
+    except OperationalError as e:
+        # Older SQLite builds lack FTS5 or the trigram tokenizer; search falls back to LIKE
+        logger.warning(f"Guest name FTS index unavailable: {e}")
+
+@event.listens_for(Guest.__table__, "before_drop")
+def _drop_name_search_index(target, connection, **kw):
+    """Drop the SQLite FTS5 name index so it never outlives its content table"""
+    if connection.dialect.name != "sqlite":
+        return
+    _fts_available.pop(connection.engine, None)
+    connection.exec_driver_sql(f"DROP TABLE IF EXISTS {GUEST_FTS_TABLE}")
+
+def guest_fts_available(engine) -> bool:
+    """Whether the SQLite FTS5 name index exists on this engine"""
+    if engine.dialect.name != "sqlite":
+        return False
+    available = _fts_available.get(engine)
+    if available is None:
+        available = inspect(engine).has_table(GUEST_FTS_TABLE)
+        _fts_available[engine] = available
+    return available
@@ -2,7 +2,7 @@
 Table model
 """
 
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import Column, Integer, String, ForeignKey, UniqueConstraint
 from sqlalchemy.orm import relationship
 
 from app.core.db import Base
@@ -17,5 +17,6 @@ class Table(Base):
     # Relationships
     event = relationship("Event", back_populates="tables")
     
-    # Composite unique constraint will be handled at application level
-    __table_args__ = ()
+    __table_args__ = (
+        UniqueConstraint("event_id", "table_name", name="uq_tables_event_name"),
+    )
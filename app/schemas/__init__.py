@@ -17,5 +17,6 @@ __all__ = [
     "GuestUpdate",
     "SeatingInfo",
     "CheckInRequest",
+    "CheckinMessage",
     "LookupRequest"
 ]
@@ -41,3 +41,17 @@ class CheckInRequest(BaseModel):
     """Guest check-in request"""
     public_code: str
     name: str
+
+class CheckinGuest(BaseModel):
+    """Guest fields carried in a check-in broadcast"""
+    name: Optional[str] = None
+    table_name: Optional[str] = None
+    seat_no: Optional[int] = None
+    dietary: Optional[str] = None
+
+class CheckinMessage(BaseModel):
+    """WebSocket check-in broadcast"""
+    type: str = "checkin"
+    guest: CheckinGuest
+    timestamp: str
+    was_already_checked_in: bool
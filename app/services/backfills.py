@@ -0,0 +1,36 @@
+"""
+Startup column backfills for databases created before a column existed
+"""
+
+from sqlalchemy import inspect
+
+from app.models import Event, Guest
+
+def backfill_name_lower(engine) -> None:
+    """Add and populate name_lower on databases created before the column existed"""
+    columns = {column["name"] for column in inspect(engine).get_columns(Guest.__tablename__)}
+    with engine.begin() as connection:
+        if "name_lower" not in columns:
+            connection.exec_driver_sql("ALTER TABLE guests ADD COLUMN name_lower VARCHAR(255)")
+        connection.exec_driver_sql("UPDATE guests SET name_lower = lower(name) WHERE name_lower IS NULL")
+
+def backfill_event_counters(engine) -> None:
+    """Add and populate Event's guest counters on databases created before they existed"""
+    columns = {column["name"] for column in inspect(engine).get_columns(Event.__tablename__)}
+    if "tables_cache" not in columns:
+        with engine.begin() as connection:
+            connection.exec_driver_sql("ALTER TABLE events ADD COLUMN tables_cache JSON")
+    if "tables_version" not in columns:
+        with engine.begin() as connection:
+            connection.exec_driver_sql("ALTER TABLE events ADD COLUMN tables_version INTEGER NOT NULL DEFAULT 0")
+    missing = [name for name in ("total_guests", "checked_in_count") if name not in columns]
+    if not missing:
+        return
+    with engine.begin() as connection:
+        for name in missing:
+            connection.exec_driver_sql(f"ALTER TABLE events ADD COLUMN {name} INTEGER NOT NULL DEFAULT 0")
+        connection.exec_driver_sql(
+            "UPDATE events SET "
+            "total_guests = (SELECT COUNT(*) FROM guests WHERE guests.event_id = events.id), "
+            "checked_in_count = (SELECT COUNT(*) FROM guests WHERE guests.event_id = events.id AND guests.checked_in)"
+        )
@@ -0,0 +1,69 @@
+"""
+Redis-backed response caching
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import Any, Awaitable, Callable, Optional
+
+import orjson
+
+from app.services.redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+# Summaries are invalidated on every guest change; the TTL only bounds staleness
+# from writers that bypass the API
+SUMMARY_CACHE_TTL_SECONDS = 30
+
+
+def summary_key(public_code: str) -> str:
+    return f"summary:{public_code}"
+
+
+async def get_or_set(
+    key: str,
+    ttl: int,
+    producer: Callable[[], Awaitable[Any]]
+) -> Optional[str]:
+    """Return the cached JSON payload for key, producing and storing it on a miss.
+
+    A producer result of None is passed through and not cached. Without Redis
+    configured this always calls the producer.
+    """
+    redis_client = get_redis_client()
+    if redis_client is not None:
+        try:
+            cached = await redis_client.get(key)
+            if cached is not None:
+                return cached
+        except Exception as e:
+            logger.error(f"Redis cache read failed for {key}: {e}")
+    
+    value = await producer()
+    if value is None:
+        return None
+    payload = orjson.dumps(value, default=str).decode()
+    
+    if redis_client is not None:
+        try:
+            await redis_client.set(key, payload, ex=ttl)
+        except Exception as e:
+            logger.error(f"Redis cache write failed for {key}: {e}")
+    return payload
+
+
+async def invalidate(*keys: str) -> None:
+    """Drop cached payloads; a no-op without Redis"""
+    redis_client = get_redis_client()
+    if redis_client is None or not keys:
+        return
+    try:
+        await redis_client.delete(*keys)
+    except Exception as e:
+        logger.error(f"Redis cache invalidation failed for {keys}: {e}")
+
+
+async def invalidate_summary(public_code: str) -> None:
+    await invalidate(summary_key(public_code))
@@ -2,14 +2,21 @@
 Guest check-in service with real-time broadcasting
 """
 
-from datetime import datetime
-from typing import Optional, Dict
+from typing import Optional, Dict, Tuple
+from fastapi.concurrency import run_in_threadpool
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 
 from app.models import Event, Guest
 from app.api.ws import WebSocketManager
+from app.schemas.guest import CheckinGuest, CheckinMessage
+from app.services.cache import invalidate_summary
 from app.services.repositories import EventRepo, GuestRepo, use_firestore
+from app.utils.clock import iso_now
+
+# Built once; dump_json runs pydantic-core's serializer straight to bytes
+_CHECKIN_ADAPTER = TypeAdapter(CheckinMessage)
 
 class CheckInService:
     """Service for handling guest check-ins"""
@@ -17,16 +24,16 @@ class CheckInService:
     def __init__(self, websocket_manager: WebSocketManager):
         self.websocket_manager = websocket_manager
     
-    async def check_in_guest(
-        self,
+    @staticmethod
+    def _mark_checked_in(
         public_code: str,
         guest_name: str,
         db: Session
-    ) -> Optional[Dict]:
-        """Check in a guest and broadcast the update"""
+    ) -> Optional[Tuple[Dict, bool]]:
+        """Blocking storage half of a check-in; returns (guest fields, was_checked_in)"""
         # SQLAlchemy path
         if not use_firestore():
-            event = EventRepo.get_by_public_code_sql(db, public_code)
+            event = EventRepo.get_ref_by_public_code_sql(db, public_code)
             if not event:
                 return None
 
@@ -34,9 +41,7 @@ class CheckInService:
             if not guest:
                 return None
 
-            was_checked_in = guest.checked_in
-            GuestRepo.set_checked_in_sql(db, guest)
-
+            # Read fields before the commit expires them
             message_guest = {
                 "name": guest.name,
                 "table_name": guest.table_name,
@@ -44,18 +49,16 @@ class CheckInService:
                 "dietary": guest.dietary,
             }
 
-        else:
-            # Firestore path
-            event_doc = EventRepo.get_by_public_code_fs(public_code)
-            if not event_doc:
-                return None
+            was_checked_in = not GuestRepo.set_checked_in_sql(db, guest.id)
 
+        else:
+            # Firestore path; guests live under their event's document, so
+            # finding one already proves the event exists
             guest_doc = GuestRepo.find_by_name_fs(public_code, guest_name)
             if not guest_doc:
                 return None
 
-            was_checked_in = bool(guest_doc.get("checked_in"))
-            GuestRepo.set_checked_in_fs(public_code, guest_doc["id"])
+            was_checked_in = not GuestRepo.set_checked_in_fs(public_code, guest_doc["id"])
 
             message_guest = {
                 "name": guest_doc.get("name"),
@@ -64,16 +67,34 @@ class CheckInService:
                 "dietary": guest_doc.get("dietary"),
             }
 
-        # Prepare broadcast message
-        message = {
-            "type": "checkin",
-            "guest": message_guest,
-            "timestamp": datetime.utcnow().isoformat(),
-            "was_already_checked_in": was_checked_in
-        }
+        return message_guest, was_checked_in
+    
+    async def check_in_guest(
+        self,
+        public_code: str,
+        guest_name: str,
+        db: Session
+    ) -> Optional[Dict]:
+        """Check in a guest and broadcast the update"""
+        # Database round-trips run in the threadpool so the loop keeps serving websockets
+        result = await run_in_threadpool(self._mark_checked_in, public_code, guest_name, db)
+        if result is None:
+            return None
+        message_guest, was_checked_in = result
+        if not was_checked_in:
+            await invalidate_summary(public_code)
+
+        # Prepare broadcast message (values are trusted, so skip validation)
+        message = CheckinMessage.model_construct(
+            guest=CheckinGuest.model_construct(**message_guest),
+            timestamp=iso_now(),
+            was_already_checked_in=was_checked_in
+        )
         
-        # Broadcast to all connected clients for this event
-        await self.websocket_manager.broadcast_to_event(public_code, message)
+        # Serialize once and broadcast to all connected clients for this event
+        await self.websocket_manager.broadcast_bytes_to_event(
+            public_code, _CHECKIN_ADAPTER.dump_json(message)
+        )
         
         return {"guest": message_guest, "was_already_checked_in": was_checked_in}
     
@@ -86,7 +107,7 @@ class CheckInService:
         
         message = {
             "type": update_type,
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": iso_now(),
             "message": "Seating arrangement has been updated"
         }
         
@@ -109,7 +130,7 @@ class CheckInService:
                 "dietary": guest.dietary,
                 "checked_in": guest.checked_in
             },
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": iso_now()
         }
         
         await self.websocket_manager.broadcast_to_event(public_code, message)
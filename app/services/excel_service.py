@@ -4,12 +4,25 @@ Excel processing service for guest data import/export
 
 import os
 import io
-from typing import List, Dict, Any, Tuple
+import shutil
+import tempfile
+from typing import List, Dict, Any, Tuple, BinaryIO, Union
 import pandas as pd
+import xlsxwriter
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
 
 from app.models import Event, Guest, Table
-from app.core.db import get_db
+from app.core.db import get_db, utcnow
+
+# Read workbooks with the Rust calamine parser when installed; openpyxl otherwise
+try:
+    import python_calamine  # noqa: F401
+    EXCEL_READ_ENGINE = "calamine"
+except ImportError:
+    EXCEL_READ_ENGINE = None
 
 class ExcelService:
     """Service for handling Excel operations"""
@@ -61,11 +74,8 @@ class ExcelService:
         return len(errors) == 0, errors
     
     @staticmethod
-    def validate_data_constraints(df: pd.DataFrame) -> Tuple[bool, List[str]]:
-        """Validate data constraints like table size limits"""
-        errors = []
-        
-        # Normalize column names
+    def _map_columns(df: pd.DataFrame) -> Dict[str, str]:
+        """Map the sheet's headers onto name/table/seat/dietary, case-insensitively"""
         column_mapping = {}
         for col in df.columns:
             col_lower = col.lower().strip()
@@ -77,6 +87,14 @@ class ExcelService:
                 column_mapping['seat'] = col
             elif 'dietary' in col_lower:
                 column_mapping['dietary'] = col
+        return column_mapping
+    
+    @staticmethod
+    def validate_data_constraints(df: pd.DataFrame) -> Tuple[bool, List[str]]:
+        """Validate data constraints like table size limits"""
+        errors = []
+        
+        column_mapping = ExcelService._map_columns(df)
         
         # Check table size constraints
         if 'table' in column_mapping:
@@ -94,17 +112,48 @@ class ExcelService:
             except (ValueError, TypeError):
                 errors.append("Seat numbers must be numeric")
         
-        # Check for duplicate seats within same table
+        # Check for duplicate seats within same table; only clashing rows get grouped
         if 'table' in column_mapping and 'seat' in column_mapping:
-            duplicates = df.groupby([column_mapping['table'], column_mapping['seat']]).size()
-            duplicate_seats = duplicates[duplicates > 1]
+            key = [column_mapping['table'], column_mapping['seat']]
+            clashing = df.duplicated(subset=key, keep=False)
             
-            if not duplicate_seats.empty:
+            if clashing.any():
+                duplicate_seats = df[clashing].groupby(key).size()
                 for (table, seat), count in duplicate_seats.items():
                     errors.append(f"Duplicate seat {seat} in table '{table}' ({count} times)")
         
         return len(errors) == 0, errors
     
+    @staticmethod
+    def _normalize_guests(df: pd.DataFrame) -> pd.DataFrame:
+        """Normalize a validated sheet into guest columns, skipping rows without a name.
+
+        Output columns: name, name_lower, table_name, seat_no, dietary, checked_in
+        """
+        column_mapping = ExcelService._map_columns(df)
+        
+        # Skip empty rows
+        names = df[column_mapping['name']]
+        names = names[names.notna()].astype(str).str.strip()
+        rows = df.loc[names[names != ''].index]
+        name = names.loc[rows.index]
+        
+        # Normalize dietary preference
+        dietary = rows[column_mapping['dietary']].fillna('none').astype(str).str.lower().str.strip()
+        dietary = dietary.mask(dietary.isin(['', 'nan', 'none']), 'none')
+        dietary = dietary.mask(dietary == 'veg', 'vegetarian')
+        dietary = dietary.mask(dietary.str.contains('allerg', regex=False), 'allergies:' + dietary)
+        
+        return pd.DataFrame({
+            'name': name,
+            'name_lower': name.str.lower(),
+            # Missing table cells keep str(NaN)'s spelling, as the row-wise import did
+            'table_name': rows[column_mapping['table']].fillna('nan').astype(str).str.strip(),
+            'seat_no': pd.to_numeric(rows[column_mapping['seat']]).astype(int),
+            'dietary': dietary,
+            'checked_in': False
+        })
+    
     @staticmethod
     def process_excel_upload(
         file_content: bytes, 
@@ -112,9 +161,27 @@ class ExcelService:
         db: Session
     ) -> Tuple[bool, List[str], int]:
         """Process uploaded Excel file and update database"""
+        return ExcelService._import_excel(io.BytesIO(file_content), event_id, db)
+    
+    @staticmethod
+    def process_excel_path(
+        file_path: str,
+        event_id: int,
+        db: Session
+    ) -> Tuple[bool, List[str], int]:
+        """Process an Excel file already on disk and update database"""
+        return ExcelService._import_excel(file_path, event_id, db)
+    
+    @staticmethod
+    def _import_excel(
+        source: Union[str, BinaryIO],
+        event_id: int,
+        db: Session
+    ) -> Tuple[bool, List[str], int]:
+        """Validate an Excel source and replace the event's guests and tables"""
         try:
             # Read Excel file
-            df = pd.read_excel(io.BytesIO(file_content))
+            df = pd.read_excel(source, engine=EXCEL_READ_ENGINE)
             
             # Validate structure
             valid_structure, structure_errors = ExcelService.validate_excel_structure(df)
@@ -126,73 +193,80 @@ class ExcelService:
             if not valid_data:
                 return False, data_errors, 0
             
-            # Create column mapping
-            column_mapping = {}
-            for col in df.columns:
-                col_lower = col.lower().strip()
-                if 'name' in col_lower:
-                    column_mapping['name'] = col
-                elif 'table' in col_lower:
-                    column_mapping['table'] = col
-                elif 'seat' in col_lower:
-                    column_mapping['seat'] = col
-                elif 'dietary' in col_lower:
-                    column_mapping['dietary'] = col
+            guests = ExcelService._normalize_guests(df)
             
             # Clear existing guests for this event
             db.query(Guest).filter(Guest.event_id == event_id).delete()
             db.query(Table).filter(Table.event_id == event_id).delete()
             
-            # Process data
-            processed_count = 0
-            tables_created = set()
+            # Tables in order of first appearance; guest mappings straight from the frame
+            # (bulk inserts skip ORM hooks, so name_lower comes from _normalize_guests)
+            table_rows = [
+                {'event_id': event_id, 'table_name': table_name}
+                for table_name in pd.unique(guests['table_name'])
+            ]
             
-            for _, row in df.iterrows():
-                # Skip empty rows
-                if pd.isna(row[column_mapping['name']]) or str(row[column_mapping['name']]).strip() == '':
-                    continue
-                
-                table_name = str(row[column_mapping['table']]).strip()
-                
-                # Create table if not exists
-                if table_name not in tables_created:
-                    table = Table(
-                        event_id=event_id,
-                        table_name=table_name
-                    )
-                    db.add(table)
-                    tables_created.add(table_name)
-                
-                # Normalize dietary preference
-                dietary = str(row[column_mapping['dietary']]).lower().strip()
-                if dietary in ['', 'nan', 'none']:
-                    dietary = 'none'
-                elif dietary in ['vegetarian', 'veg']:
-                    dietary = 'vegetarian'
-                elif dietary in ['halal']:
-                    dietary = 'halal'
-                elif 'allerg' in dietary:
-                    dietary = f"allergies:{dietary}"
-                
-                # Create guest
-                guest = Guest(
-                    event_id=event_id,
-                    name=str(row[column_mapping['name']]).strip(),
-                    table_name=table_name,
-                    seat_no=int(row[column_mapping['seat']]),
-                    dietary=dietary,
-                    checked_in=False
-                )
-                db.add(guest)
-                processed_count += 1
+            # One batched INSERT per table instead of a unit-of-work entry per row
+            ExcelService._insert_tables(db, table_rows)
+            ExcelService._insert_guests(db, guests.assign(event_id=event_id))
             
+            # The guest list was replaced wholesale, so reset the event's counters
+            db.execute(
+                update(Event)
+                .where(Event.id == event_id)
+                .values(total_guests=len(guests), checked_in_count=0, tables_version=Event.tables_version + 1)
+                .execution_options(synchronize_session=False)
+            )
             db.commit()
-            return True, [], processed_count
+            return True, [], len(guests)
             
         except Exception as e:
             db.rollback()
             return False, [f"Error processing Excel file: {str(e)}"], 0
 
+    @staticmethod
+    def _insert_tables(db: Session, table_rows: List[Dict[str, Any]]) -> None:
+        """Insert table rows in one statement, ignoring ones that already exist"""
+        if not table_rows:
+            return
+        dialect = db.get_bind().dialect.name
+        if dialect == "postgresql":
+            stmt = pg_insert(Table).values(table_rows).on_conflict_do_nothing(constraint="uq_tables_event_name")
+        elif dialect == "sqlite":
+            stmt = sqlite_insert(Table).values(table_rows).on_conflict_do_nothing()
+        else:
+            db.bulk_insert_mappings(Table, table_rows)
+            return
+        db.execute(stmt)
+
+    @staticmethod
+    def _insert_guests(db: Session, guests: pd.DataFrame) -> None:
+        """Insert normalized guest rows, streaming them through COPY on PostgreSQL"""
+        if guests.empty:
+            return
+        if db.get_bind().dialect.name != "postgresql":
+            db.bulk_insert_mappings(Guest, guests.to_dict('records'))
+            return
+        
+        # COPY skips the ORM's utcnow() default, so stamp updated_at from the
+        # database clock as an ORM insert would
+        guests = guests.assign(updated_at=db.scalar(select(utcnow())))
+        
+        # COPY runs on the session's own connection, so it commits or rolls
+        # back with the rest of the import
+        columns = list(guests.columns)
+        buffer = io.StringIO()
+        guests.to_csv(buffer, index=False, header=False)
+        buffer.seek(0)
+        cursor = db.connection().connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY {Guest.__tablename__} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+                buffer
+            )
+        finally:
+            cursor.close()
+
     @staticmethod
     def parse_excel_to_records(file_content: bytes) -> Tuple[bool, List[str], List[Dict[str, Any]]]:
         """Parse and validate Excel, returning normalized guest records.
@@ -200,7 +274,7 @@ class ExcelService:
         Output guest dict keys: name, name_lower, table_name, seat_no, dietary, checked_in
         """
         try:
-            df = pd.read_excel(io.BytesIO(file_content))
+            df = pd.read_excel(io.BytesIO(file_content), engine=EXCEL_READ_ENGINE)
 
             valid_structure, structure_errors = ExcelService.validate_excel_structure(df)
             if not valid_structure:
@@ -210,46 +284,7 @@ class ExcelService:
             if not valid_data:
                 return False, data_errors, []
 
-            # Create column mapping
-            column_mapping: Dict[str, str] = {}
-            for col in df.columns:
-                col_lower = col.lower().strip()
-                if 'name' in col_lower:
-                    column_mapping['name'] = col
-                elif 'table' in col_lower:
-                    column_mapping['table'] = col
-                elif 'seat' in col_lower:
-                    column_mapping['seat'] = col
-                elif 'dietary' in col_lower:
-                    column_mapping['dietary'] = col
-
-            records: List[Dict[str, Any]] = []
-            for _, row in df.iterrows():
-                if pd.isna(row[column_mapping['name']]) or str(row[column_mapping['name']]).strip() == '':
-                    continue
-
-                table_name = str(row[column_mapping['table']]).strip()
-                dietary = str(row[column_mapping['dietary']]).lower().strip()
-                if dietary in ['', 'nan', 'none']:
-                    dietary = 'none'
-                elif dietary in ['vegetarian', 'veg']:
-                    dietary = 'vegetarian'
-                elif dietary in ['halal']:
-                    dietary = 'halal'
-                elif 'allerg' in dietary:
-                    dietary = f"allergies:{dietary}"
-
-                name = str(row[column_mapping['name']]).strip()
-                seat_no = int(row[column_mapping['seat']])
-
-                records.append({
-                    'name': name,
-                    'name_lower': name.lower(),
-                    'table_name': table_name,
-                    'seat_no': seat_no,
-                    'dietary': dietary,
-                    'checked_in': False
-                })
+            records: List[Dict[str, Any]] = ExcelService._normalize_guests(df).to_dict('records')
 
             return True, [], records
 
@@ -259,37 +294,61 @@ class ExcelService:
     @staticmethod
     def export_current_data(event_id: int, db: Session, include_checkin: bool = True) -> bytes:
         """Export current guest data to Excel"""
-        guests = db.query(Guest).filter(Guest.event_id == event_id).all()
-        
-        data = []
-        for guest in guests:
-            row = {
-                'Name': guest.name,
-                'Table': guest.table_name,
-                'Seat No.': guest.seat_no,
-                'Dietary Preference': guest.dietary
-            }
-            if include_checkin:
-                row['Checked In'] = 'Yes' if guest.checked_in else 'No'
-            
-            data.append(row)
+        buffer = io.BytesIO()
+        ExcelService.write_current_data(buffer, event_id, db, include_checkin=include_checkin)
+        return buffer.getvalue()
+    
+    @staticmethod
+    def export_current_data_file(event_id: int, db: Session, include_checkin: bool = True) -> str:
+        """Export current guest data to a temporary .xlsx file; the caller removes it"""
+        with tempfile.NamedTemporaryFile(suffix=".xlsx", delete=False) as tmp:
+            try:
+                ExcelService.write_current_data(tmp, event_id, db, include_checkin=include_checkin)
+            except Exception:
+                tmp.close()
+                os.remove(tmp.name)
+                raise
+        return tmp.name
+    
+    @staticmethod
+    def write_current_data(
+        output: BinaryIO,
+        event_id: int,
+        db: Session,
+        include_checkin: bool = True
+    ) -> None:
+        """Write current guest data as an Excel workbook to a binary stream"""
+        # constant_memory flushes each row to disk as it is written, so peak
+        # memory stays flat however many guests the event has
+        workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+        sheet = workbook.add_worksheet('Guest List')
         
-        df = pd.DataFrame(data)
+        header = ['Name', 'Table', 'Seat No.', 'Dietary Preference']
+        if include_checkin:
+            header.append('Checked In')
+        sheet.write_row(0, 0, header)
         
-        buffer = io.BytesIO()
-        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False, sheet_name='Guest List')
+        rows = db.query(
+            Guest.name, Guest.table_name, Guest.seat_no, Guest.dietary, Guest.checked_in
+        ).filter(Guest.event_id == event_id).order_by(Guest.id).yield_per(1000)
+        for row_index, (name, table_name, seat_no, dietary, checked_in) in enumerate(rows, start=1):
+            row = [name, table_name, seat_no, dietary]
+            if include_checkin:
+                row.append('Yes' if checked_in else 'No')
+            sheet.write_row(row_index, 0, row)
         
-        return buffer.getvalue()
+        workbook.close()
     
     @staticmethod
-    def save_original_file(file_content: bytes, event_id: int) -> str:
-        """Save original uploaded file"""
+    def save_original_upload(file_obj: BinaryIO, event_id: int) -> str:
+        """Stream an uploaded file to disk as the event's original workbook"""
         upload_dir = f"uploads/{event_id}"
         os.makedirs(upload_dir, exist_ok=True)
         
+        # Copy in chunks to a temp file, then swap it into place atomically
         file_path = f"{upload_dir}/original.xlsx"
-        with open(file_path, 'wb') as f:
-            f.write(file_content)
+        with tempfile.NamedTemporaryFile(dir=upload_dir, suffix=".part", delete=False) as tmp:
+            shutil.copyfileobj(file_obj, tmp)
+        os.replace(tmp.name, file_path)
         
         return file_path
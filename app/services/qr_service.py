@@ -2,38 +2,49 @@
 QR code generation service
 """
 
+import hashlib
 import io
+import os
+import shutil
+import tempfile
+from functools import lru_cache
 from typing import Union
 import qrcode
 from PIL import Image
 
 from app.core.config import settings
 
+# Rendered QR images, one directory per event
+QR_CACHE_DIR = "uploads/qr"
+
+@lru_cache(maxsize=1024)
+def _render_event_qr(public_code: str, format: str) -> bytes:
+    """Render an event's QR image; deterministic per code, so results are memoized"""
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=10,
+        border=4,
+    )
+    qr.add_data(QRService.get_qr_url(public_code))
+    qr.make(fit=True)
+    
+    # Create QR code image
+    img = qr.make_image(fill_color="black", back_color="white")
+    
+    # Convert to bytes
+    buffer = io.BytesIO()
+    img.save(buffer, format=format)
+    
+    return buffer.getvalue()
+
 class QRService:
     """Service for generating QR codes"""
     
     @staticmethod
     def generate_event_qr(public_code: str, format: str = 'PNG') -> bytes:
         """Generate QR code for event guest portal"""
-        url = f"{settings.BASE_URL}/guest/portal?event={public_code}"
-        
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(url)
-        qr.make(fit=True)
-        
-        # Create QR code image
-        img = qr.make_image(fill_color="black", back_color="white")
-        
-        # Convert to bytes
-        buffer = io.BytesIO()
-        img.save(buffer, format=format)
-        
-        return buffer.getvalue()
+        return _render_event_qr(public_code, format)
     
     @staticmethod
     def save_qr_image(public_code: str, file_path: str = None) -> str:
@@ -48,6 +59,31 @@ class QRService:
         
         return file_path
     
+    @staticmethod
+    def get_cached_qr_path(public_code: str) -> str:
+        """Return the path of the event's QR image, generating it on first use"""
+        # Keyed by the encoded URL too, so a BASE_URL change renders a fresh image
+        url_hash = hashlib.sha256(QRService.get_qr_url(public_code).encode()).hexdigest()[:16]
+        qr_dir = os.path.join(QR_CACHE_DIR, public_code)
+        file_path = os.path.join(qr_dir, f"{url_hash}.png")
+        if os.path.exists(file_path):
+            return file_path
+        
+        os.makedirs(qr_dir, exist_ok=True)
+        qr_bytes = QRService.generate_event_qr(public_code)
+        
+        # Write to a temp file and rename so concurrent readers never see a partial image
+        with tempfile.NamedTemporaryFile(dir=qr_dir, suffix=".part", delete=False) as tmp:
+            tmp.write(qr_bytes)
+        os.replace(tmp.name, file_path)
+        
+        return file_path
+    
+    @staticmethod
+    def remove_cached_qr(public_code: str) -> None:
+        """Delete an event's cached QR images"""
+        shutil.rmtree(os.path.join(QR_CACHE_DIR, public_code), ignore_errors=True)
+    
     @staticmethod
     def get_qr_url(public_code: str) -> str:
         """Get the URL that the QR code will redirect to"""
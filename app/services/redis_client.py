@@ -0,0 +1,19 @@
+"""
+Redis initialization and helpers
+"""
+
+from __future__ import annotations
+
+from functools import lru_cache
+
+import redis.asyncio as redis
+
+from app.core.config import settings
+
+
+@lru_cache(maxsize=1)
+def get_redis_client():
+    """Return a cached asyncio Redis client if REDIS_URL is configured, else None."""
+    if not settings.REDIS_URL:
+        return None
+    return redis.from_url(settings.REDIS_URL, decode_responses=True)
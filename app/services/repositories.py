@@ -6,13 +6,20 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import quote
 
-from sqlalchemy.orm import Session
+from firebase_admin import firestore
+
+from sqlalchemy import case, distinct, func, select, text, update
+from sqlalchemy.orm import Session, load_only, raiseload
 
 from app.core.config import settings
 from app.models import Event, Guest
+from app.models.guest import GUEST_FTS_TABLE, guest_fts_available
 from app.services.firebase_client import get_firestore_client
+from app.utils.cache import TTLCache
+from app.utils.clock import iso_now
 
 
 def use_firestore() -> bool:
@@ -21,7 +28,39 @@ def use_firestore() -> bool:
 
 # -------- Event repository --------
 
+@dataclass(frozen=True)
+class EventRef:
+    """Lightweight handle for an event resolved from its public code"""
+    id: int
+    name: str
+    date: datetime
+
+
+# public_code -> EventRef; misses are not cached so new events resolve immediately
+_event_ref_cache = TTLCache(maxsize=1024, ttl=60)
+
+# public_code -> Firestore event document, with the same hit-only policy
+_event_doc_cache = TTLCache(maxsize=1024, ttl=60)
+
+
 class EventRepo:
+    @staticmethod
+    def get_ref_by_public_code_sql(db: Session, public_code: str) -> Optional[EventRef]:
+        ref = _event_ref_cache.get(public_code)
+        if ref is not None:
+            return ref
+        row = db.query(Event.id, Event.name, Event.date).filter(Event.public_code == public_code).first()
+        if row is None:
+            return None
+        ref = EventRef(id=row.id, name=row.name, date=row.date)
+        _event_ref_cache.set(public_code, ref)
+        return ref
+
+    @staticmethod
+    def invalidate_public_code(public_code: str) -> None:
+        _event_ref_cache.pop(public_code)
+        _event_doc_cache.pop(public_code)
+
     @staticmethod
     def get_by_public_code_sql(db: Session, public_code: str) -> Optional[Event]:
         return db.query(Event).filter(Event.public_code == public_code).first()
@@ -30,6 +69,65 @@ class EventRepo:
     def get_by_id_sql(db: Session, event_id: int) -> Optional[Event]:
         return db.query(Event).filter(Event.id == event_id).first()
 
+    @staticmethod
+    def get_detail_counts_sql(db: Session, event_id: int) -> Tuple[int, int, int]:
+        """Return (total_guests, total_tables, checked_in_count)"""
+        # Guest counters are denormalized on the event row; tables are counted
+        # from the (event_id, table_name, seat_no) index
+        total_tables = db.query(func.count(distinct(Guest.table_name))).filter(Guest.event_id == event_id).scalar_subquery()
+        row = db.query(Event.total_guests, total_tables, Event.checked_in_count).filter(Event.id == event_id).one_or_none()
+        if row is None:
+            return 0, 0, 0
+        total_guests, total_tables, checked_in_count = row
+        return total_guests, total_tables, checked_in_count
+
+    @staticmethod
+    def get_tables_cache_sql(db: Session, event_id: int) -> Tuple[Optional[List[Dict[str, Any]]], int]:
+        """Return (snapshot tables or None if stale, the event's current tables_version)"""
+        row = db.query(Event.tables_cache, Event.tables_version).filter(Event.id == event_id).one_or_none()
+        if row is None:
+            return None, 0
+        cache = row.tables_cache
+        if not cache or cache.get("version") != row.tables_version:
+            return None, row.tables_version
+        return cache["tables"], row.tables_version
+
+    @staticmethod
+    def summarize_tables_sql(db: Session, event_id: int) -> List[Dict[str, Any]]:
+        """Per-table guest and check-in counts for an event, ordered by table name"""
+        rows = db.query(
+            Guest.table_name,
+            func.count().label('total_guests'),
+            func.count().filter(Guest.checked_in == True).label('checked_in')
+        ).filter(
+            Guest.event_id == event_id
+        ).group_by(Guest.table_name).order_by(Guest.table_name).all()
+        return [
+            {
+                "table_name": row.table_name,
+                "total_guests": row.total_guests,
+                "checked_in": row.checked_in,
+                "available_seats": 12 - row.total_guests
+            }
+            for row in rows
+        ]
+
+    @staticmethod
+    def set_tables_cache_sql(db: Session, event_id: int, version: int, tables: List[Dict[str, Any]]) -> None:
+        """Store a snapshot built at tables_version == version.
+
+        Guest writes bump tables_version, so a snapshot whose reads raced a write
+        matches no row and is dropped. At most one store lands per version.
+        """
+        result = db.execute(
+            update(Event)
+            .where(Event.id == event_id, Event.tables_version == version)
+            .values(tables_cache={"version": version, "tables": tables})
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount:
+            db.commit()
+
     @staticmethod
     def create_sql(db: Session, name: str, date: datetime, organizer_email: str, public_code: str) -> Event:
         event = Event(name=name, date=date, organizer_email=organizer_email, public_code=public_code)
@@ -41,11 +139,18 @@ class EventRepo:
     # Firestore shape: collection "events/{public_code}" document with fields
     @staticmethod
     def get_by_public_code_fs(public_code: str) -> Optional[Dict[str, Any]]:
+        data = _event_doc_cache.get(public_code)
+        if data is not None:
+            return data
         fs = get_firestore_client()
         if not fs:
             return None
         doc = fs.collection("events").document(public_code).get()
-        return doc.to_dict() if doc.exists else None
+        if not doc.exists:
+            return None
+        data = doc.to_dict()
+        _event_doc_cache.set(public_code, data)
+        return data
 
     @staticmethod
     def create_fs(name: str, date_iso: str, organizer_email: str, public_code: str) -> Dict[str, Any]:
@@ -63,32 +168,113 @@ class EventRepo:
 
 # -------- Guest repository --------
 
+def _name_needle(name: str) -> str:
+    """Normalize a typed guest name for matching against name_lower"""
+    return name.strip().strip("\"'").strip().lower()
+
+
+def _exact_first(needle: str):
+    """Sort key placing a guest named exactly needle ahead of longer matches"""
+    return case((Guest.name_lower == needle, 0), else_=1)
+
+
+def name_contains_clause(db: Session, term: str):
+    """Filter clause for guests whose name contains term, case-insensitively"""
+    # Trigram FTS needs at least three characters to match anything
+    if len(term) >= 3 and guest_fts_available(db.get_bind()):
+        phrase = '"' + term.replace('"', '""') + '"'
+        matches = text(
+            f"SELECT rowid FROM {GUEST_FTS_TABLE} WHERE {GUEST_FTS_TABLE} MATCH :phrase"
+        ).bindparams(phrase=phrase)
+        return Guest.id.in_(matches)
+    
+    # On Postgres the pg_trgm GIN index on name_lower accelerates this LIKE
+    return Guest.name_lower.like(f"%{term.lower()}%")
+
+
+_GUEST_FS_FIELDS = ["name", "table_name", "seat_no", "dietary", "checked_in"]
+_TABLE_MATE_FS_FIELDS = ["name", "seat_no", "dietary", "checked_in"]
+
+
 class GuestRepo:
     @staticmethod
     def find_by_name_sql(db: Session, event_id: int, name_icontains: str) -> Optional[Guest]:
-        from sqlalchemy import func
-        return db.query(Guest).filter(
-            Guest.event_id == event_id,
-            func.lower(Guest.name).like(f"%{name_icontains.lower()}%")
+        needle = _name_needle(name_icontains)
+        # Only the columns lookups and check-ins read; .first() already adds LIMIT 1
+        query = db.query(Guest).options(
+            load_only(Guest.id, Guest.name, Guest.table_name, Guest.seat_no, Guest.dietary, Guest.checked_in),
+            raiseload("*")
+        ).filter(Guest.event_id == event_id)
+        # Prefix matches can seek the (event_id, name_lower) index, with an exact
+        # name ranked first; only scan for a substring when no name starts with the needle
+        guest = query.filter(Guest.name_lower.like(f"{needle}%")).order_by(
+            _exact_first(needle), Guest.id
         ).first()
+        if guest is None:
+            guest = query.filter(name_contains_clause(db, needle)).order_by(Guest.id).first()
+        return guest
+
+    @staticmethod
+    def find_with_table_mates_sql(db: Session, event_id: int, name_icontains: str) -> Tuple[Optional[Any], List[Any]]:
+        """Find a guest by name together with their table mates in one round trip.
+
+        Rows carry name, table_name, seat_no, checked_in and dietary; mates are ordered by seat.
+        """
+        needle = _name_needle(name_icontains)
+        # Same prefix-then-substring matching as find_by_name_sql
+        for name_clause in (Guest.name_lower.like(f"{needle}%"), name_contains_clause(db, needle)):
+            match = select(Guest.id, Guest.table_name).where(
+                Guest.event_id == event_id,
+                name_clause
+            ).order_by(_exact_first(needle), Guest.id).limit(1).subquery()
+            rows = db.query(
+                match.c.id.label("match_id"),
+                Guest.id, Guest.name, Guest.table_name, Guest.seat_no, Guest.checked_in, Guest.dietary
+            ).join(match, Guest.table_name == match.c.table_name).filter(
+                Guest.event_id == event_id
+            ).order_by(Guest.seat_no).all()
+            if rows:
+                guest = next(row for row in rows if row.id == row.match_id)
+                return guest, [row for row in rows if row.id != row.match_id]
+        return None, []
 
     @staticmethod
     def list_table_sql(db: Session, event_id: int, table_name: str) -> List[Guest]:
-        return db.query(Guest).filter(Guest.event_id == event_id, Guest.table_name == table_name).order_by(Guest.seat_no).all()
+        # raiseload guards serialization against accidental per-guest lazy loads
+        return db.query(Guest).options(raiseload("*")).filter(
+            Guest.event_id == event_id, Guest.table_name == table_name
+        ).order_by(Guest.seat_no).all()
 
     @staticmethod
-    def set_checked_in_sql(db: Session, guest: Guest) -> None:
-        guest.checked_in = True
-        guest.updated_at = datetime.utcnow()
+    def set_checked_in_sql(db: Session, guest_id: int) -> bool:
+        """Mark a guest checked in; False if they already were (decided atomically in SQL)"""
+        result = db.execute(
+            update(Guest)
+            .where(Guest.id == guest_id, Guest.checked_in.isnot(True))
+            .values(checked_in=True)
+            .execution_options(synchronize_session=False)
+        )
+        checked_in_now = result.rowcount == 1
+        if checked_in_now:
+            # Core UPDATEs skip the session's counter hook, so bump the counter
+            # and retire the table snapshot here in the same transaction
+            db.execute(
+                update(Event)
+                .where(Event.id == select(Guest.event_id).where(Guest.id == guest_id).scalar_subquery())
+                .values(checked_in_count=Event.checked_in_count + 1, tables_version=Event.tables_version + 1)
+                .execution_options(synchronize_session=False)
+            )
         db.commit()
+        return checked_in_now
 
-    # Firestore guest docs under collection events/{public_code}/guests
+    # Firestore guest docs under collection events/{public_code}/guests;
+    # reads use field masks so only the fields callers use come back
     @staticmethod
     def find_by_name_fs(public_code: str, name_icontains: str) -> Optional[Dict[str, Any]]:
         fs = get_firestore_client()
         if not fs:
             return None
-        guests = fs.collection("events").document(public_code).collection("guests").where("name_lower", "==", name_icontains.lower()).get()
+        guests = fs.collection("events").document(public_code).collection("guests").where("name_lower", "==", name_icontains.lower()).select(_GUEST_FS_FIELDS).limit(1).get()
         if guests:
             doc = guests[0]
             data = doc.to_dict()
@@ -100,7 +286,7 @@ class GuestRepo:
     @staticmethod
     def list_table_fs(public_code: str, table_name: str) -> List[Dict[str, Any]]:
         fs = get_firestore_client()
-        docs = fs.collection("events").document(public_code).collection("guests").where("table_name", "==", table_name).order_by("seat_no").get()
+        docs = fs.collection("events").document(public_code).collection("guests").where("table_name", "==", table_name).order_by("seat_no").select(_TABLE_MATE_FS_FIELDS).get()
         results: List[Dict[str, Any]] = []
         for d in docs:
             item = d.to_dict()
@@ -109,11 +295,142 @@ class GuestRepo:
         return results
 
     @staticmethod
-    def set_checked_in_fs(public_code: str, guest_id: str) -> None:
+    def add_guests_fs(public_code: str, records: List[Dict[str, Any]]) -> None:
+        """Write imported guests plus one summary document per table"""
+        fs = get_firestore_client()
+        event_ref = fs.collection("events").document(public_code)
+        guests_col = event_ref.collection("guests")
+        tables_col = event_ref.collection("tables")
+
+        guests = [(guests_col.document(), rec) for rec in records]
+        writes = [(doc_ref, rec) for doc_ref, rec in guests]
+        for table_name, summary in _table_summaries((doc_ref.id, rec) for doc_ref, rec in guests).items():
+            writes.append((tables_col.document(_table_doc_id(table_name)), summary))
+        _commit_writes(fs, writes)
+        _table_summary_cache.pop(public_code)
+
+    @staticmethod
+    def replace_guests_fs(public_code: str, records: List[Dict[str, Any]]) -> None:
+        """Replace an event's guests and table summaries with imported records"""
+        fs = get_firestore_client()
+        event_ref = fs.collection("events").document(public_code)
+        stale = [d.reference for d in event_ref.collection("guests").select([]).get()]
+        stale += [d.reference for d in event_ref.collection("tables").select([]).get()]
+        _commit_writes(fs, [(ref, None) for ref in stale])
+        GuestRepo.add_guests_fs(public_code, records)
+
+    @staticmethod
+    def set_checked_in_fs(public_code: str, guest_id: str) -> bool:
+        """Mark a guest as checked in and bump their table summary.
+
+        Returns True only for the call that actually flipped the flag.
+        """
         fs = get_firestore_client()
-        fs.collection("events").document(public_code).collection("guests").document(guest_id).set({
-            "checked_in": True,
-            "updated_at": datetime.utcnow().isoformat()
-        }, merge=True)
+        event_ref = fs.collection("events").document(public_code)
+        guest_ref = event_ref.collection("guests").document(guest_id)
+
+        @firestore.transactional
+        def mark(transaction) -> bool:
+            snapshot = guest_ref.get(transaction=transaction)
+            data = snapshot.to_dict() or {}
+            if data.get("checked_in"):
+                return False
+
+            # Events imported before table summaries existed have none;
+            # TableSummaryRepo.list_fs rebuilds them from the guests
+            table_ref = event_ref.collection("tables").document(_table_doc_id(data.get("table_name")))
+            table_exists = table_ref.get(transaction=transaction).exists
+
+            transaction.set(guest_ref, {
+                "checked_in": True,
+                "updated_at": iso_now()
+            }, merge=True)
+            if table_exists:
+                transaction.set(table_ref, {
+                    "checked_in": firestore.Increment(1),
+                    "guests": {guest_id: {"checked_in": True}},
+                }, merge=True)
+            return True
+
+        checked_in_now = mark(fs.transaction())
+        if checked_in_now:
+            _table_summary_cache.pop(public_code)
+        return checked_in_now
+
+
+# -------- Table summary repository --------
 
+# Short TTL: writes from this process invalidate, other workers catch up quickly
+_table_summary_cache = TTLCache(maxsize=1024, ttl=5)
 
+
+# Firestore rejects batches of more than 500 writes
+FS_BATCH_LIMIT = 500
+
+
+def _table_doc_id(table_name: Any) -> str:
+    """Table names are free text; document ids may not contain '/'"""
+    return quote(str(table_name), safe="")
+
+
+def _table_summaries(guests: Iterable[Tuple[str, Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+    """Build table summary documents from (guest doc id, guest record) pairs"""
+    summaries: Dict[str, Dict[str, Any]] = {}
+    for doc_id, rec in guests:
+        summary = summaries.setdefault(rec.get("table_name"), {
+            "table_name": rec.get("table_name"),
+            "total_guests": 0,
+            "checked_in": 0,
+            "guests": {},
+        })
+        summary["total_guests"] += 1
+        summary["checked_in"] += 1 if rec.get("checked_in") else 0
+        summary["guests"][doc_id] = {
+            "name": rec.get("name"),
+            "seat_no": rec.get("seat_no"),
+            "checked_in": bool(rec.get("checked_in")),
+            "dietary": rec.get("dietary"),
+        }
+    return summaries
+
+
+def _commit_writes(fs, writes: List[Tuple[Any, Optional[Dict[str, Any]]]]) -> None:
+    """Apply (doc ref, data) writes in batches; None data deletes the document"""
+    for start in range(0, len(writes), FS_BATCH_LIMIT):
+        batch = fs.batch()
+        for doc_ref, data in writes[start:start + FS_BATCH_LIMIT]:
+            if data is None:
+                batch.delete(doc_ref)
+            else:
+                batch.set(doc_ref, data)
+        batch.commit()
+
+
+class TableSummaryRepo:
+    # Firestore docs under events/{public_code}/tables, maintained by GuestRepo writes
+    @staticmethod
+    def list_fs(public_code: str) -> List[Dict[str, Any]]:
+        summaries = _table_summary_cache.get(public_code)
+        if summaries is not None:
+            return summaries
+        fs = get_firestore_client()
+        docs = fs.collection("events").document(public_code).collection("tables").get()
+        summaries = [d.to_dict() for d in docs]
+        if not summaries:
+            summaries = TableSummaryRepo.rebuild_fs(public_code)
+        _table_summary_cache.set(public_code, summaries)
+        return summaries
+
+    @staticmethod
+    def rebuild_fs(public_code: str) -> List[Dict[str, Any]]:
+        """Recompute an event's table summary docs from its guests collection"""
+        fs = get_firestore_client()
+        event_ref = fs.collection("events").document(public_code)
+        guests = event_ref.collection("guests").select(_GUEST_FS_FIELDS).get()
+        summaries = _table_summaries((d.id, d.to_dict()) for d in guests)
+        tables_col = event_ref.collection("tables")
+        _commit_writes(fs, [
+            (tables_col.document(_table_doc_id(table_name)), summary)
+            for table_name, summary in summaries.items()
+        ])
+        return list(summaries.values())
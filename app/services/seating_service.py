@@ -2,13 +2,34 @@
 Seating arrangement and validation service
 """
 
-from typing import List, Dict, Optional
-from sqlalchemy.orm import Session
+from dataclasses import dataclass
+from itertools import groupby
+from operator import attrgetter
+import logging
+from typing import Callable, Iterator, List, Dict, Optional, Tuple
+
+import orjson
+from sqlalchemy.orm import Session, Query
 from sqlalchemy import func
 
+from app.core.db import SessionLocal
 from app.models import Event, Guest, Table
 from app.schemas.event import SeatingInfo
-from app.services.repositories import EventRepo, GuestRepo, use_firestore
+from app.services.repositories import EventRepo, GuestRepo, TableSummaryRepo, name_contains_clause, use_firestore
+
+logger = logging.getLogger(__name__)
+
+# Guest rows fetched per round trip when streaming a named summary
+SUMMARY_STREAM_BATCH_SIZE = 500
+
+@dataclass(frozen=True, slots=True)
+class TableGuest:
+    """A guest as listed for one table"""
+    id: int
+    name: str
+    seat_no: int
+    dietary: str
+    checked_in: bool
 
 class SeatingService:
     """Service for seating arrangement operations"""
@@ -22,23 +43,14 @@ class SeatingService:
         """Get seating information for a specific guest"""
         
         if not use_firestore():
-            event = EventRepo.get_by_public_code_sql(db, public_code)
+            event = EventRepo.get_ref_by_public_code_sql(db, public_code)
             if not event:
                 return None
 
-            guest = db.query(Guest).filter(
-                Guest.event_id == event.id,
-                func.lower(Guest.name).like(f"%{guest_name.lower()}%")
-            ).first()
+            guest, table_mates = GuestRepo.find_with_table_mates_sql(db, event.id, guest_name)
             if not guest:
                 return None
 
-            table_mates = db.query(Guest).filter(
-                Guest.event_id == event.id,
-                Guest.table_name == guest.table_name,
-                Guest.id != guest.id
-            ).all()
-
             table_mates_info = [
                 {
                     "name": mate.name,
@@ -58,10 +70,7 @@ class SeatingService:
                 table_mates=table_mates_info
             )
         else:
-            event_doc = EventRepo.get_by_public_code_fs(public_code)
-            if not event_doc:
-                return None
-
+            # A guest found under the event's document implies the event exists
             guest_doc = GuestRepo.find_by_name_fs(public_code, guest_name)
             if not guest_doc:
                 return None
@@ -87,6 +96,11 @@ class SeatingService:
                 table_mates=table_mates_info
             )
     
+    @staticmethod
+    def search_names(event_id: int, term: str, db: Session) -> Query:
+        """Query an event's guests whose name contains term (case-insensitive)"""
+        return db.query(Guest).filter(Guest.event_id == event_id, name_contains_clause(db, term))
+    
     @staticmethod
     def get_seating_summary(
         public_code: str, 
@@ -96,50 +110,45 @@ class SeatingService:
         """Get public seating summary"""
         
         if not use_firestore():
-            event = EventRepo.get_by_public_code_sql(db, public_code)
+            event = EventRepo.get_ref_by_public_code_sql(db, public_code)
             if not event:
                 return None
         
-            table_stats = db.query(
-                Guest.table_name,
-                func.count(Guest.id).label('total_guests'),
-                func.sum(Guest.checked_in.cast('integer')).label('checked_in')
-            ).filter(
-                Guest.event_id == event.id
-            ).group_by(Guest.table_name).all()
-
             tables = []
-            for stat in table_stats:
-                table_info = {
-                    "table_name": stat.table_name,
-                    "total_guests": stat.total_guests,
-                    "checked_in": stat.checked_in or 0,
-                    "available_seats": 12 - stat.total_guests
-                }
-
-                if include_names:
-                    guests = db.query(Guest).filter(
-                        Guest.event_id == event.id,
-                        Guest.table_name == stat.table_name
-                    ).order_by(Guest.seat_no).all()
+            if include_names:
+                # One ordered scan of the event's guests, bucketed per table
+                rows = db.query(
+                    Guest.table_name, Guest.name, Guest.seat_no, Guest.checked_in, Guest.dietary
+                ).filter(
+                    Guest.event_id == event.id
+                ).order_by(Guest.table_name, Guest.seat_no).all()
 
-                    table_info["guests"] = [
+                for table_name, bucket in groupby(rows, key=attrgetter("table_name")):
+                    guests = [
                         {
-                            "name": guest.name,
-                            "seat_no": guest.seat_no,
-                            "checked_in": guest.checked_in,
-                            "dietary": guest.dietary
+                            "name": row.name,
+                            "seat_no": row.seat_no,
+                            "checked_in": row.checked_in,
+                            "dietary": row.dietary
                         }
-                        for guest in guests
+                        for row in bucket
                     ]
-
-                tables.append(table_info)
-
-            total_guests = db.query(func.count(Guest.id)).filter(Guest.event_id == event.id).scalar()
-            checked_in_guests = db.query(func.count(Guest.id)).filter(
-                Guest.event_id == event.id,
-                Guest.checked_in == True
-            ).scalar()
+                    tables.append({
+                        "table_name": table_name,
+                        "total_guests": len(guests),
+                        "checked_in": sum(1 for guest in guests if guest["checked_in"]),
+                        "available_seats": 12 - len(guests),
+                        "guests": guests
+                    })
+            else:
+                tables, version = EventRepo.get_tables_cache_sql(db, event.id)
+                if tables is None:
+                    tables = EventRepo.summarize_tables_sql(db, event.id)
+                    EventRepo.set_tables_cache_sql(db, event.id, version, tables)
+            
+            # Event totals fall out of the per-table numbers; no extra COUNT queries
+            total_guests = sum(table["total_guests"] for table in tables)
+            checked_in_guests = sum(table["checked_in"] for table in tables)
 
             return {
                 "event_name": event.name,
@@ -154,47 +163,109 @@ class SeatingService:
             if not event_doc:
                 return None
 
-            # gather table stats from Firestore guests
-            mates = GuestRepo.list_table_fs(public_code, table_name="*") if False else None  # placeholder unused
-            # Simplified: fetch all guests in event
-            from app.services.firebase_client import get_firestore_client
-            fs = get_firestore_client()
-            docs = fs.collection("events").document(public_code).collection("guests").get()
-            all_guests = [d.to_dict() for d in docs]
-
-            tables_map: dict[str, list[dict]] = {}
-            for g in all_guests:
-                tables_map.setdefault(g.get("table_name"), []).append(g)
-
+            # One read per table from the denormalized summaries, not one per guest
             tables = []
-            for table_name, people in tables_map.items():
+            for summary in TableSummaryRepo.list_fs(public_code):
                 table_info = {
-                    "table_name": table_name,
-                    "total_guests": len(people),
-                    "checked_in": sum(1 for p in people if p.get("checked_in")),
-                    "available_seats": 12 - len(people)
+                    "table_name": summary.get("table_name"),
+                    "total_guests": summary.get("total_guests", 0),
+                    "checked_in": summary.get("checked_in", 0),
+                    "available_seats": 12 - summary.get("total_guests", 0)
                 }
                 if include_names:
-                    table_info["guests"] = [
-                        {
-                            "name": p.get("name"),
-                            "seat_no": p.get("seat_no"),
-                            "checked_in": p.get("checked_in"),
-                            "dietary": p.get("dietary")
-                        }
-                        for p in sorted(people, key=lambda x: x.get("seat_no") or 0)
-                    ]
+                    table_info["guests"] = sorted(
+                        summary.get("guests", {}).values(),
+                        key=lambda x: x.get("seat_no") or 0
+                    )
                 tables.append(table_info)
 
             return {
                 "event_name": event_doc.get("name"),
                 "event_date": event_doc.get("date"),
-                "total_guests": sum(len(v) for v in tables_map.values()),
-                "checked_in_guests": sum(1 for g in all_guests if g.get("checked_in")),
+                "total_guests": sum(table["total_guests"] for table in tables),
+                "checked_in_guests": sum(table["checked_in"] for table in tables),
                 "total_tables": len(tables),
                 "tables": tables
             }
     
+    @staticmethod
+    def stream_seating_summary(
+        public_code: str,
+        db: Session,
+        session_factory: Callable[[], Session] = SessionLocal
+    ) -> Optional[Iterator[bytes]]:
+        """Stream the named seating summary response body one table at a time.
+
+        SQL only. Returns None when the event does not exist; otherwise the body
+        matches get_seating_summary's envelope, with the totals after the tables
+        since they are summed while streaming.
+
+        The body is sent after the request's session is closed, so the guest
+        rows are read through a session of the generator's own.
+        """
+        event = EventRepo.get_ref_by_public_code_sql(db, public_code)
+        if not event:
+            return None
+        
+        def chunks() -> Iterator[bytes]:
+            stream_db = session_factory()
+            try:
+                yield from table_chunks(stream_db)
+            except Exception:
+                # Headers are already sent; aborting the body is all that is left
+                logger.exception(f"Seating summary stream failed for event {public_code}")
+                raise
+            finally:
+                stream_db.close()
+        
+        def table_chunks(stream_db: Session) -> Iterator[bytes]:
+            rows = stream_db.query(
+                Guest.table_name, Guest.name, Guest.seat_no, Guest.checked_in, Guest.dietary
+            ).filter(
+                Guest.event_id == event.id
+            ).order_by(Guest.table_name, Guest.seat_no).yield_per(SUMMARY_STREAM_BATCH_SIZE)
+            
+            head = orjson.dumps({
+                "success": True,
+                "message": "Seating summary retrieved successfully",
+                "data": {"event_name": event.name, "event_date": event.date.isoformat()}
+            })
+            # Reopen the data object to append the tables array
+            yield head[:-2] + b',"tables":['
+            
+            total_guests = checked_in_guests = total_tables = 0
+            for table_name, bucket in groupby(rows, key=attrgetter("table_name")):
+                guests = [
+                    {
+                        "name": row.name,
+                        "seat_no": row.seat_no,
+                        "checked_in": row.checked_in,
+                        "dietary": row.dietary
+                    }
+                    for row in bucket
+                ]
+                checked_in = sum(1 for guest in guests if guest["checked_in"])
+                table = orjson.dumps({
+                    "table_name": table_name,
+                    "total_guests": len(guests),
+                    "checked_in": checked_in,
+                    "available_seats": 12 - len(guests),
+                    "guests": guests
+                })
+                yield table if total_tables == 0 else b"," + table
+                
+                total_guests += len(guests)
+                checked_in_guests += checked_in
+                total_tables += 1
+            
+            yield b'],' + orjson.dumps({
+                "total_guests": total_guests,
+                "checked_in_guests": checked_in_guests,
+                "total_tables": total_tables
+            })[1:] + b'}'
+        
+        return chunks()
+    
     @staticmethod
     def validate_table_capacity(
         event_id: int,
@@ -225,7 +296,7 @@ class SeatingService:
     ) -> bool:
         """Validate that seat number is unique within table"""
         
-        query = db.query(Guest).filter(
+        query = db.query(Guest.id).filter(
             Guest.event_id == event_id,
             Guest.table_name == table_name,
             Guest.seat_no == seat_no
@@ -237,26 +308,46 @@ class SeatingService:
         existing_guest = query.first()
         return existing_guest is None
     
+    @staticmethod
+    def validate_placement(
+        event_id: int,
+        table_name: str,
+        seat_no: int,
+        exclude_guest_id: Optional[int],
+        db: Session
+    ) -> Tuple[bool, bool]:
+        """Check table capacity and seat uniqueness in one query.
+
+        Returns (capacity_ok, seat_unique).
+        """
+        
+        query = db.query(
+            func.count(Guest.id),
+            func.count(Guest.id).filter(Guest.seat_no == seat_no)
+        ).filter(
+            Guest.event_id == event_id,
+            Guest.table_name == table_name
+        )
+        
+        if exclude_guest_id:
+            query = query.filter(Guest.id != exclude_guest_id)
+        
+        table_count, seat_taken = query.one()
+        return table_count < 12, seat_taken == 0
+    
     @staticmethod
     def get_table_guests(
         event_id: int,
         table_name: str,
         db: Session
-    ) -> List[Dict]:
-        """Get all guests for a specific table"""
+    ) -> List[TableGuest]:
+        """Get all guests for a specific table, in seat order"""
         
-        guests = db.query(Guest).filter(
+        rows = db.query(
+            Guest.id, Guest.name, Guest.seat_no, Guest.dietary, Guest.checked_in
+        ).filter(
             Guest.event_id == event_id,
             Guest.table_name == table_name
         ).order_by(Guest.seat_no).all()
         
-        return [
-            {
-                "id": guest.id,
-                "name": guest.name,
-                "seat_no": guest.seat_no,
-                "dietary": guest.dietary,
-                "checked_in": guest.checked_in
-            }
-            for guest in guests
-        ]
+        return [TableGuest(*row) for row in rows]
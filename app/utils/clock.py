@@ -0,0 +1,19 @@
+"""
+Timestamp helpers
+"""
+
+import time
+from typing import Tuple
+
+# (epoch second, formatted timestamp) for the most recent call
+_last_stamp: Tuple[int, str] = (0, "")
+
+def iso_now() -> str:
+    """Current UTC time as ISO-8601 at second precision, formatted at most once per second"""
+    global _last_stamp
+    second = int(time.time())
+    cached_second, stamp = _last_stamp
+    if cached_second != second:
+        stamp = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(second))
+        _last_stamp = (second, stamp)
+    return stamp
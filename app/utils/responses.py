@@ -3,24 +3,27 @@ Standardized response utilities
 """
 
 from typing import Any, Optional
+import orjson
 from fastapi import HTTPException, status
 from fastapi.responses import JSONResponse
 
-from app.schemas.common import StandardResponse, ErrorResponse
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered in a single orjson pass"""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=str)
 
 def success_response(
     message: str,
     data: Any = None,
     status_code: int = 200
-) -> JSONResponse:
+) -> ORJSONResponse:
     """Create standardized success response"""
-    response = StandardResponse(
-        success=True,
-        message=message,
-        data=data
-    )
-    return JSONResponse(
-        content=response.dict(),
+    # StandardResponse's shape as a plain dict: orjson encodes it natively,
+    # where pydantic would fall back to its generic serializer for `data: Any`
+    return ORJSONResponse(
+        content={"success": True, "message": message, "data": data},
         status_code=status_code
     )
 
@@ -29,15 +32,11 @@ def error_response(
     error_code: Optional[str] = None,
     details: Any = None,
     status_code: int = 400
-) -> JSONResponse:
+) -> ORJSONResponse:
     """Create standardized error response"""
-    response = ErrorResponse(
-        message=message,
-        error_code=error_code,
-        details=details
-    )
-    return JSONResponse(
-        content=response.dict(),
+    # ErrorResponse's shape as a plain dict, see success_response
+    return ORJSONResponse(
+        content={"success": False, "message": message, "error_code": error_code, "details": details},
         status_code=status_code
     )
 
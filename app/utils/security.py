@@ -4,59 +4,142 @@ Security utilities and authentication
 
 from fastapi import HTTPException, Depends, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from typing import Dict
+from typing import Dict, Optional
+import hmac
+import ipaddress
+import logging
 import time
-from collections import defaultdict
+from collections import OrderedDict, deque
 
 from app.core.config import settings
+from app.services.redis_client import get_redis_client
 
-# Simple in-memory rate limiter
-rate_limiter = defaultdict(list)
+logger = logging.getLogger(__name__)
+
+# Simple in-memory rate limiter: request timestamps per IP, least recently seen first
+rate_limiter: "OrderedDict[str, deque]" = OrderedDict()
+
+RATE_LIMIT_WINDOW_SECONDS = 60
+
+# Bound on tracked IPs so address scans can't grow the limiter without limit
+RATE_LIMITER_MAX_IPS = 100_000
+
+# Fixed-window counter: INCR, and start the window's expiry on the first hit
+_RATE_LIMIT_SCRIPT = """
+local count = redis.call('INCR', KEYS[1])
+if count == 1 then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+return count
+"""
 
 security = HTTPBearer()
 
+# Expected admin token, encoded once for constant-time comparison
+_ADMIN_TOKEN_BYTES = settings.ADMIN_TOKEN.encode()
+
+def is_admin_token(token: Optional[str]) -> bool:
+    """Constant-time check of a candidate admin token"""
+    if not token:
+        return False
+    return hmac.compare_digest(token.encode(), _ADMIN_TOKEN_BYTES)
+
 def verify_admin_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Verify admin authentication token"""
-    if credentials.credentials != settings.ADMIN_TOKEN:
+    if not is_admin_token(credentials.credentials):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid admin token"
         )
     return credentials.credentials
 
-def rate_limit_check(client_ip: str, limit: int = None) -> bool:
-    """Simple rate limiting by IP address"""
+async def rate_limit_check(client_ip: str, limit: int = None) -> bool:
+    """Rate limiting by IP address, shared across workers when Redis is configured"""
     if limit is None:
         limit = settings.RATE_LIMIT_PER_MINUTE
     
-    current_time = time.time()
-    minute_ago = current_time - 60
+    redis_client = get_redis_client()
+    if redis_client is not None:
+        try:
+            count = await redis_client.eval(
+                _RATE_LIMIT_SCRIPT, 1, f"ratelimit:{client_ip}", RATE_LIMIT_WINDOW_SECONDS
+            )
+            return int(count) <= limit
+        except Exception as e:
+            logger.error(f"Redis rate limit check failed, using in-memory limiter: {e}")
+    
+    return _local_rate_limit_check(client_ip, limit)
+
+def _local_rate_limit_check(client_ip: str, limit: int) -> bool:
+    """Per-process sliding-window rate limiting"""
+    current_time = time.monotonic()
+    minute_ago = current_time - RATE_LIMIT_WINDOW_SECONDS
+    
+    requests = rate_limiter.get(client_ip)
+    if requests is None:
+        requests = rate_limiter[client_ip] = deque(maxlen=limit)
+        if len(rate_limiter) > RATE_LIMITER_MAX_IPS:
+            rate_limiter.popitem(last=False)
+    else:
+        rate_limiter.move_to_end(client_ip)
     
-    # Clean old requests
-    rate_limiter[client_ip] = [
-        req_time for req_time in rate_limiter[client_ip] 
-        if req_time > minute_ago
-    ]
+    # Drop requests that fell out of the window; timestamps are in order
+    while requests and requests[0] <= minute_ago:
+        requests.popleft()
     
     # Check limit
-    if len(rate_limiter[client_ip]) >= limit:
+    if len(requests) >= limit:
         return False
     
     # Add current request
-    rate_limiter[client_ip].append(current_time)
+    requests.append(current_time)
     return True
 
-def get_client_ip(request) -> str:
-    """Extract client IP from request"""
-    # Check for forwarded IP first (for reverse proxy setups)
-    forwarded_for = request.headers.get("X-Forwarded-For")
-    if forwarded_for:
-        return forwarded_for.split(",")[0].strip()
-    
-    # Check for real IP header
-    real_ip = request.headers.get("X-Real-IP")
-    if real_ip:
-        return real_ip
+def resolve_client_ip(headers: Dict[bytes, bytes], peer: Optional[str], trusted_hops: int) -> Optional[str]:
+    """Pick the client address, believing at most trusted_hops proxies.
+
+    Each trusted proxy appends the address it saw to X-Forwarded-For, so the
+    client is trusted_hops entries from the right; anything further left is
+    caller-supplied and ignored.
+    """
+    if trusted_hops > 0:
+        forwarded_for = headers.get(b"x-forwarded-for")
+        if forwarded_for:
+            # maxsplit bounds the work however long an injected header is
+            hops = forwarded_for.decode("latin-1").rsplit(",", trusted_hops)
+            candidate = hops[-trusted_hops] if len(hops) > trusted_hops else hops[0]
+        else:
+            candidate = headers.get(b"x-real-ip", b"").decode("latin-1")
+        try:
+            return str(ipaddress.ip_address(candidate.strip()))
+        except ValueError:
+            pass
     
-    # Fall back to direct client IP
-    return request.client.host
+    return peer
+
+class ClientIPMiddleware:
+    """ASGI middleware resolving the client IP once per request into request.state.client_ip"""
+
+    def __init__(self, app, trusted_hops: Optional[int] = None):
+        self.app = app
+        self.trusted_hops = settings.TRUSTED_PROXY_HOPS if trusted_hops is None else trusted_hops
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] in ("http", "websocket"):
+            client = scope.get("client")
+            scope.setdefault("state", {})["client_ip"] = resolve_client_ip(
+                dict(scope["headers"]), client[0] if client else None, self.trusted_hops
+            )
+        await self.app(scope, receive, send)
+
+def get_client_ip(request) -> str:
+    """Return the client IP resolved by ClientIPMiddleware"""
+    client_ip = getattr(request.state, "client_ip", None)
+    if client_ip is None:
+        # Middleware not installed (e.g. a bare router in tests)
+        client_ip = resolve_client_ip(
+            {k.lower(): v for k, v in request.headers.raw},
+            request.client.host if request.client else None,
+            settings.TRUSTED_PROXY_HOPS
+        )
+    return client_ip
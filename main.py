@@ -3,20 +3,26 @@ Wedding Seat Arrangement System - FastAPI Backend
 Main application entry point
 """
 
+import hashlib
 import os
 import logging
 from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Tuple
 
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, Response
 from fastapi.templating import Jinja2Templates
 import uvicorn
 
 from app.core.config import settings
 from app.core.db import engine, Base
+from app.services.backfills import backfill_event_counters, backfill_name_lower
 from app.api import routes_admin, routes_guest, routes_public, ws
+from app.utils.responses import ORJSONResponse
+from app.utils.security import ClientIPMiddleware
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -26,9 +32,14 @@ logger = logging.getLogger(__name__)
 async def lifespan(app: FastAPI):
     """Application lifespan management"""
     # Create database tables
-    Base.metadata.create_all(bind=engine)
-    logger.info("Database tables created")
+    if settings.AUTO_CREATE_SCHEMA:
+        Base.metadata.create_all(bind=engine)
+        backfill_name_lower(engine)
+        backfill_event_counters(engine)
+        logger.info("Database tables created")
     yield
+    # Close pooled connections cleanly
+    engine.dispose()
     logger.info("Application shutdown")
 
 # Create FastAPI application
@@ -36,7 +47,8 @@ app = FastAPI(
     title="Wedding Seat Arrangement System",
     description="Production-ready backend for wedding seating management",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # Add CORS middleware
@@ -48,6 +60,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Resolve the client IP once per request for rate limiting
+app.add_middleware(ClientIPMiddleware)
+
 # Mount static files
 os.makedirs("static", exist_ok=True)
 os.makedirs("uploads", exist_ok=True)
@@ -62,21 +77,28 @@ app.include_router(routes_guest.router, prefix="/guest", tags=["guest"])
 app.include_router(routes_admin.router, prefix="/admin", tags=["admin"])
 app.include_router(ws.router, prefix="/ws", tags=["websocket"])
 
+@lru_cache(maxsize=None)
+def _render_page(template_name: str, title: str) -> Tuple[bytes, str]:
+    """Render a page with constant context once; returns (html, etag)"""
+    html = templates.get_template(template_name).render(title=title).encode()
+    return html, f'"{hashlib.sha256(html).hexdigest()[:32]}"'
+
+def _page_response(request: Request, template_name: str, title: str) -> Response:
+    html, etag = _render_page(template_name, title)
+    headers = {"Cache-Control": "public, max-age=300", "ETag": etag}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return HTMLResponse(content=html, headers=headers)
+
 @app.get("/", response_class=HTMLResponse)
 async def root(request: Request):
     """Root endpoint with basic info"""
-    return templates.TemplateResponse("guest_portal.html", {
-        "request": request,
-        "title": "Wedding Seating System"
-    })
+    return _page_response(request, "guest_portal.html", "Wedding Seating System")
 
 @app.get("/admin", response_class=HTMLResponse)
 async def admin_panel(request: Request):
     """Admin panel for creating events and uploading Excel files"""
-    return templates.TemplateResponse("admin_panel.html", {
-        "request": request,
-        "title": "Wedding Admin Panel"
-    })
+    return _page_response(request, "admin_panel.html", "Wedding Admin Panel")
 
 # Note: Run this ASGI app directly with Uvicorn or Hypercorn. For Gunicorn,
 # use `uvicorn.workers.UvicornWorker` instead of wrapping the app.
@@ -0,0 +1,105 @@
+"""
+Shared test fixtures
+"""
+
+import pytest
+from sqlalchemy import create_engine, event, update
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.db import Base
+from app.models import Event, Guest
+from app.services.repositories import _event_doc_cache, _event_ref_cache, _table_summary_cache
+
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False)
+
+def open_session(connection):
+    """Session on a test connection"""
+    # Commits inside the code under test only release savepoints
+    return TestingSessionLocal(bind=connection, join_transaction_mode="create_savepoint")
+
+def insert_guests(db, event_id, rows):
+    """Insert guest rows in one executemany.
+
+    Core inserts skip the ORM hooks, so name_lower and the event counters are
+    filled in here, as the Excel import does.
+    """
+    db.execute(
+        Guest.__table__.insert(),
+        [{**row, "event_id": event_id, "name_lower": row["name"].lower()} for row in rows]
+    )
+    db.execute(
+        update(Event)
+        .where(Event.id == event_id)
+        .values(
+            total_guests=Event.total_guests + len(rows),
+            checked_in_count=Event.checked_in_count + sum(1 for row in rows if row.get("checked_in"))
+        )
+    )
+
+# pysqlite manages transactions itself and breaks SAVEPOINTs; let SQLAlchemy emit BEGIN
+def _disable_pysqlite_transactions(dbapi_connection, connection_record):
+    dbapi_connection.isolation_level = None
+
+def _emit_begin(connection):
+    connection.exec_driver_sql("BEGIN")
+
+@pytest.fixture(scope="session")
+def engine():
+    """One in-memory database shared through a single connection"""
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    event.listen(engine, "connect", _disable_pysqlite_transactions)
+    event.listen(engine, "begin", _emit_begin)
+    yield engine
+    engine.dispose()
+
+@pytest.fixture(scope="module")
+def db_connection(engine):
+    """Module-wide connection; its outer transaction holds the shared fixtures"""
+    Base.metadata.create_all(bind=engine)
+    connection = engine.connect()
+    transaction = connection.begin()
+    yield connection
+    transaction.rollback()
+    connection.close()
+    Base.metadata.drop_all(bind=engine)
+
+@pytest.fixture
+def db_session(db_connection):
+    """Create test database session, rolled back after each test"""
+    savepoint = db_connection.begin_nested()
+    db = open_session(db_connection)
+    try:
+        yield db
+    finally:
+        db.close()
+        savepoint.rollback()
+
+@pytest.fixture(autouse=True)
+def clear_event_cache():
+    """Reset the public_code caches so event ids don't leak between test databases"""
+    _event_ref_cache.clear()
+    _event_doc_cache.clear()
+    _table_summary_cache.clear()
+    yield
+    _event_ref_cache.clear()
+    _event_doc_cache.clear()
+    _table_summary_cache.clear()
+
+@pytest.fixture
+def sql_counter(db_session):
+    """Collect the SELECT statements the test's session sends, to catch N+1 regressions"""
+    queries = []
+    
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            queries.append(statement)
+    
+    connection = db_session.connection()
+    event.listen(connection, "before_cursor_execute", record)
+    yield queries
+    event.remove(connection, "before_cursor_execute", record)
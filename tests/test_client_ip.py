@@ -0,0 +1,25 @@
+"""
+Tests for client IP resolution behind reverse proxies
+"""
+
+from app.utils.security import resolve_client_ip
+
+PEER = "10.0.0.5"
+
+def test_single_proxy_uses_rightmost_forwarded_entry():
+    """A spoofed left-hand entry is ignored when only one proxy is trusted"""
+    headers = {b"x-forwarded-for": b"6.6.6.6, 203.0.113.7"}
+    assert resolve_client_ip(headers, PEER, 1) == "203.0.113.7"
+
+def test_multiple_trusted_hops():
+    """Each trusted hop moves the client one entry to the left"""
+    headers = {b"x-forwarded-for": b"203.0.113.7, 10.0.0.1, 10.0.0.2"}
+    assert resolve_client_ip(headers, PEER, 3) == "203.0.113.7"
+    assert resolve_client_ip({b"x-forwarded-for": b"203.0.113.7"}, PEER, 3) == "203.0.113.7"
+
+def test_untrusted_or_invalid_headers_fall_back_to_peer():
+    """Forwarding headers are ignored with no trusted proxies or unparsable values"""
+    assert resolve_client_ip({b"x-forwarded-for": b"203.0.113.7"}, PEER, 0) == PEER
+    assert resolve_client_ip({b"x-forwarded-for": b"not-an-ip"}, PEER, 1) == PEER
+    assert resolve_client_ip({b"x-real-ip": b"203.0.113.9"}, PEER, 1) == "203.0.113.9"
+    assert resolve_client_ip({}, PEER, 1) == PEER
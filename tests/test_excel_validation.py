@@ -5,35 +5,18 @@ Tests for Excel validation functionality
 import pytest
 import pandas as pd
 import io
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import xlsxwriter
+from datetime import datetime
 
-from app.core.db import Base
 from app.models import Event, Guest, Table
 from app.services.excel_service import ExcelService
 
-# Test database setup
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-@pytest.fixture
-def db_session():
-    """Create test database session"""
-    Base.metadata.create_all(bind=engine)
-    db = TestingSessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-        Base.metadata.drop_all(bind=engine)
-
 @pytest.fixture
 def sample_event(db_session):
     """Create a sample event for testing"""
     event = Event(
         name="Test Wedding",
-        date="2024-06-15",
+        date=datetime(2024, 6, 15),
         organizer_email="test@example.com",
         public_code="TEST123"
     )
@@ -44,10 +27,15 @@ def sample_event(db_session):
 
 def create_test_excel(data):
     """Helper function to create Excel bytes from data"""
-    df = pd.DataFrame(data)
     buffer = io.BytesIO()
-    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False)
+    # constant_memory streams rows instead of building the workbook tree in
+    # memory; it needs row-by-row writes, which pandas' to_excel doesn't do
+    workbook = xlsxwriter.Workbook(buffer, {'constant_memory': True})
+    sheet = workbook.add_worksheet()
+    sheet.write_row(0, 0, list(data))
+    for row_idx, row in enumerate(zip(*data.values()), start=1):
+        sheet.write_row(row_idx, 0, row)
+    workbook.close()
     return buffer.getvalue()
 
 def test_validate_excel_structure_valid():
@@ -0,0 +1,146 @@
+"""
+Tests for Firestore table summary documents
+"""
+
+import itertools
+
+import pytest
+from firebase_admin import firestore
+
+from app.services import repositories
+from app.services.repositories import GuestRepo, TableSummaryRepo
+
+class FakeSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return None if self._data is None else dict(self._data)
+
+class FakeDocument:
+    def __init__(self, store, path):
+        self._store = store
+        self.path = path
+        self.id = path[-1]
+
+    def collection(self, name):
+        return FakeCollection(self._store, self.path + (name,))
+
+    def get(self, transaction=None):
+        return FakeSnapshot(self, self._store.docs.get(self.path))
+
+class FakeCollection:
+    def __init__(self, store, path):
+        self._store = store
+        self.path = path
+
+    def document(self, doc_id=None):
+        return FakeDocument(self._store, self.path + (doc_id or f"doc{next(self._store.ids)}",))
+
+    def select(self, fields):
+        return self
+
+    def get(self):
+        depth = len(self.path) + 1
+        return [
+            FakeSnapshot(FakeDocument(self._store, path), data)
+            for path, data in self._store.docs.items()
+            if len(path) == depth and path[:-1] == self.path
+        ]
+
+def _merge(target, updates):
+    for key, value in updates.items():
+        if isinstance(value, firestore.Increment):
+            target[key] = target.get(key, 0) + value.value
+        elif isinstance(value, dict):
+            _merge(target.setdefault(key, {}), value)
+        else:
+            target[key] = value
+
+class FakeWriter:
+    """Applies batch and transaction writes immediately"""
+
+    def __init__(self, store):
+        self._store = store
+
+    def set(self, doc_ref, data, merge=False):
+        current = self._store.docs.get(doc_ref.path) if merge else None
+        document = dict(current or {})
+        _merge(document, data)
+        self._store.docs[doc_ref.path] = document
+
+    def delete(self, doc_ref):
+        self._store.docs.pop(doc_ref.path, None)
+
+    def commit(self):
+        pass
+
+class FakeFirestore:
+    def __init__(self):
+        self.docs = {}
+        self.ids = itertools.count(1)
+
+    def collection(self, name):
+        return FakeCollection(self, (name,))
+
+    def batch(self):
+        return FakeWriter(self)
+
+    def transaction(self):
+        return FakeWriter(self)
+
+@pytest.fixture
+def fake_fs(monkeypatch):
+    """In-memory Firestore holding one legacy event with no table summaries"""
+    fs = FakeFirestore()
+    monkeypatch.setattr(repositories, "get_firestore_client", lambda: fs)
+    # The fake writer applies transaction writes directly, so run the function as-is
+    monkeypatch.setattr(repositories.firestore, "transactional", lambda func: func)
+
+    guests = fs.collection("events").document("EVT").collection("guests")
+    for doc_id, name, table_name, seat_no in [
+        ("g1", "John Doe", "A1", 1),
+        ("g2", "Jane Smith", "A1", 2),
+        ("g3", "Alice Brown", "B/1", 1),
+    ]:
+        fs.docs[guests.path + (doc_id,)] = {
+            "name": name, "table_name": table_name, "seat_no": seat_no,
+            "dietary": "none", "checked_in": False
+        }
+    return fs
+
+def test_check_in_without_table_summary(fake_fs):
+    """Check-in works for events imported before table summaries existed"""
+    assert GuestRepo.set_checked_in_fs("EVT", "g1")
+    assert not GuestRepo.set_checked_in_fs("EVT", "g1")
+    assert fake_fs.docs[("events", "EVT", "guests", "g1")]["checked_in"]
+
+def test_table_summary_rebuilt_from_guests(fake_fs):
+    """Missing summaries are rebuilt from the guests, then kept up by check-ins"""
+    assert GuestRepo.set_checked_in_fs("EVT", "g2")
+
+    summaries = {s["table_name"]: s for s in TableSummaryRepo.list_fs("EVT")}
+    assert summaries["A1"]["total_guests"] == 2
+    assert summaries["A1"]["checked_in"] == 1
+    assert summaries["B/1"]["total_guests"] == 1
+    assert ("events", "EVT", "tables", "B%2F1") in fake_fs.docs
+
+    repositories._table_summary_cache.clear()
+    assert GuestRepo.set_checked_in_fs("EVT", "g1")
+    summaries = {s["table_name"]: s for s in TableSummaryRepo.list_fs("EVT")}
+    assert summaries["A1"]["checked_in"] == 2
+    assert summaries["A1"]["guests"]["g1"]["checked_in"]
+
+def test_replace_guests_rewrites_table_summaries(fake_fs):
+    """A re-upload replaces the guests and their table summaries"""
+    TableSummaryRepo.list_fs("EVT")
+    GuestRepo.replace_guests_fs("EVT", [
+        {"name": "New Guest", "table_name": "C1", "seat_no": 1, "dietary": "none", "checked_in": False},
+    ])
+
+    assert [s["table_name"] for s in TableSummaryRepo.list_fs("EVT")] == ["C1"]
+    guests = fake_fs.collection("events").document("EVT").collection("guests").get()
+    assert [g.to_dict()["name"] for g in guests] == ["New Guest"]
@@ -4,32 +4,20 @@ Tests for guest lookup and check-in functionality
 
 import pytest
 from datetime import datetime
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import IntegrityError
 
-from app.core.db import Base
+from app.core.db import utcnow
 from app.models import Event, Guest, Table
+from app.services.repositories import GuestRepo
 from app.services.seating_service import SeatingService
+from tests.conftest import insert_guests, open_session
 
-# Test database setup
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test_lookup.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-@pytest.fixture
-def db_session():
-    """Create test database session"""
-    Base.metadata.create_all(bind=engine)
-    db = TestingSessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-        Base.metadata.drop_all(bind=engine)
-
-@pytest.fixture
-def sample_event_with_guests(db_session):
-    """Create a sample event with guests for testing"""
+@pytest.fixture(scope="module")
+def sample_event_with_guests(db_connection):
+    """Create a sample event with guests once for the module"""
+    db_session = open_session(db_connection)
     # Create event
     event = Event(
         name="Test Wedding",
@@ -47,46 +35,16 @@ def sample_event_with_guests(db_session):
     db_session.add(table_b1)
     
     # Create guests
-    guests = [
-        Guest(
-            event_id=event.id,
-            name="John Doe",
-            table_name="A1",
-            seat_no=1,
-            dietary="none",
-            checked_in=False
-        ),
-        Guest(
-            event_id=event.id,
-            name="Jane Smith",
-            table_name="A1",
-            seat_no=2,
-            dietary="vegetarian",
-            checked_in=True
-        ),
-        Guest(
-            event_id=event.id,
-            name="Bob Johnson",
-            table_name="A1",
-            seat_no=3,
-            dietary="halal",
-            checked_in=False
-        ),
-        Guest(
-            event_id=event.id,
-            name="Alice Brown",
-            table_name="B1",
-            seat_no=1,
-            dietary="allergies:nuts",
-            checked_in=False
-        )
-    ]
-    
-    for guest in guests:
-        db_session.add(guest)
+    insert_guests(db_session, event.id, [
+        {"name": "John Doe", "table_name": "A1", "seat_no": 1, "dietary": "none", "checked_in": False},
+        {"name": "Jane Smith", "table_name": "A1", "seat_no": 2, "dietary": "vegetarian", "checked_in": True},
+        {"name": "Bob Johnson", "table_name": "A1", "seat_no": 3, "dietary": "halal", "checked_in": False},
+        {"name": "Alice Brown", "table_name": "B1", "seat_no": 1, "dietary": "allergies:nuts", "checked_in": False},
+    ])
     
     db_session.commit()
     db_session.refresh(event)
+    db_session.close()
     return event
 
 def test_get_guest_seating_info_exact_match(db_session, sample_event_with_guests):
@@ -142,7 +100,7 @@ def test_get_guest_seating_info_invalid_event(db_session, sample_event_with_gues
     
     assert seating_info is None
 
-def test_get_seating_summary(db_session, sample_event_with_guests):
+def test_get_seating_summary(db_session, sample_event_with_guests, sql_counter):
     """Test getting seating summary"""
     summary = SeatingService.get_seating_summary(
         public_code="TEST123",
@@ -150,6 +108,8 @@ def test_get_seating_summary(db_session, sample_event_with_guests):
         include_names=False
     )
     
+    # Event, cached tables snapshot, and the per-table aggregate on a miss
+    assert len(sql_counter) <= 3
     assert summary is not None
     assert summary["event_name"] == "Test Wedding"
     assert summary["total_guests"] == 4
@@ -157,11 +117,10 @@ def test_get_seating_summary(db_session, sample_event_with_guests):
     assert summary["total_tables"] == 2
     
     # Check table information
-    tables = summary["tables"]
+    tables = {table["table_name"]: table for table in summary["tables"]}
     assert len(tables) == 2
     
-    table_a1 = next((t for t in tables if t["table_name"] == "A1"), None)
-    assert table_a1 is not None
+    table_a1 = tables["A1"]
     assert table_a1["total_guests"] == 3
     assert table_a1["checked_in"] == 1
     assert table_a1["available_seats"] == 9
@@ -177,7 +136,8 @@ def test_get_seating_summary_with_names(db_session, sample_event_with_guests):
     assert summary is not None
     
     # Check that guest names are included
-    table_a1 = next((t for t in summary["tables"] if t["table_name"] == "A1"), None)
+    tables = {table["table_name"]: table for table in summary["tables"]}
+    table_a1 = tables["A1"]
     assert "guests" in table_a1
     assert len(table_a1["guests"]) == 3
     
@@ -186,6 +146,25 @@ def test_get_seating_summary_with_names(db_session, sample_event_with_guests):
     assert "Jane Smith" in guest_names
     assert "Bob Johnson" in guest_names
 
+def test_search_names(db_session, sample_event_with_guests):
+    """Test substring guest name search"""
+    event = sample_event_with_guests
+    
+    # Substring match is case-insensitive and not anchored to word starts
+    names = {g.name for g in SeatingService.search_names(event.id, "OHN", db_session)}
+    assert names == {"John Doe", "Bob Johnson"}
+    
+    # Short terms fall back to a plain LIKE scan
+    names = {g.name for g in SeatingService.search_names(event.id, "ce", db_session)}
+    assert names == {"Alice Brown"}
+    
+    # Renamed guests are found under their new name only
+    alice = SeatingService.search_names(event.id, "Alice", db_session).one()
+    alice.name = "Alicia Brown"
+    db_session.commit()
+    assert SeatingService.search_names(event.id, "Alice", db_session).count() == 0
+    assert SeatingService.search_names(event.id, "Alicia", db_session).one().id == alice.id
+
 def test_validate_table_capacity(db_session, sample_event_with_guests):
     """Test table capacity validation"""
     event = sample_event_with_guests
@@ -200,15 +179,10 @@ def test_validate_table_capacity(db_session, sample_event_with_guests):
     assert valid
     
     # Add guests to reach capacity
-    for i in range(4, 13):  # Add 9 more guests (total 12)
-        guest = Guest(
-            event_id=event.id,
-            name=f"Test Guest {i}",
-            table_name="A1",
-            seat_no=i,
-            dietary="none"
-        )
-        db_session.add(guest)
+    insert_guests(db_session, event.id, [
+        {"name": f"Test Guest {i}", "table_name": "A1", "seat_no": i, "dietary": "none"}
+        for i in range(4, 13)  # Add 9 more guests (total 12)
+    ])
     db_session.commit()
     
     # Now table should be at capacity
@@ -259,6 +233,58 @@ def test_validate_seat_uniqueness(db_session, sample_event_with_guests):
     )
     assert valid
 
+def test_seat_uniqueness_constraint(db_session, sample_event_with_guests):
+    """The schema rejects a second guest in an occupied seat"""
+    event = sample_event_with_guests
+    
+    # Seat 1 in A1 is taken by John Doe
+    db_session.add(Guest(event_id=event.id, name="Seat Thief", table_name="A1", seat_no=1))
+    with pytest.raises(IntegrityError):
+        db_session.commit()
+    db_session.rollback()
+
+def test_validate_placement(db_session, sample_event_with_guests):
+    """Test combined capacity and seat validation"""
+    event = sample_event_with_guests
+    
+    # A1 has 3 guests and seat 1 is taken by John Doe
+    capacity_ok, seat_unique = SeatingService.validate_placement(
+        event_id=event.id,
+        table_name="A1",
+        seat_no=1,
+        exclude_guest_id=None,
+        db=db_session
+    )
+    assert capacity_ok
+    assert not seat_unique
+    
+    # Seat 5 in A1 is free
+    capacity_ok, seat_unique = SeatingService.validate_placement(
+        event_id=event.id,
+        table_name="A1",
+        seat_no=5,
+        exclude_guest_id=None,
+        db=db_session
+    )
+    assert capacity_ok
+    assert seat_unique
+    
+    # Excluding John Doe frees his own seat
+    john_doe = db_session.query(Guest).filter(
+        Guest.event_id == event.id,
+        Guest.name == "John Doe"
+    ).first()
+    
+    capacity_ok, seat_unique = SeatingService.validate_placement(
+        event_id=event.id,
+        table_name="A1",
+        seat_no=1,
+        exclude_guest_id=john_doe.id,
+        db=db_session
+    )
+    assert capacity_ok
+    assert seat_unique
+
 def test_get_table_guests(db_session, sample_event_with_guests):
     """Test getting guests for a specific table"""
     event = sample_event_with_guests
@@ -272,12 +298,12 @@ def test_get_table_guests(db_session, sample_event_with_guests):
     assert len(guests) == 3
     
     # Should be ordered by seat number
-    assert guests[0]["seat_no"] == 1
-    assert guests[0]["name"] == "John Doe"
-    assert guests[1]["seat_no"] == 2
-    assert guests[1]["name"] == "Jane Smith"
-    assert guests[2]["seat_no"] == 3
-    assert guests[2]["name"] == "Bob Johnson"
+    assert guests[0].seat_no == 1
+    assert guests[0].name == "John Doe"
+    assert guests[1].seat_no == 2
+    assert guests[1].name == "Jane Smith"
+    assert guests[2].seat_no == 3
+    assert guests[2].name == "Bob Johnson"
     
     # Check B1 table
     guests_b1 = SeatingService.get_table_guests(
@@ -287,4 +313,79 @@ def test_get_table_guests(db_session, sample_event_with_guests):
     )
     
     assert len(guests_b1) == 1
-    assert guests_b1[0]["name"] == "Alice Brown"
+    assert guests_b1[0].name == "Alice Brown"
+
+def test_set_checked_in_reports_first_check_in(db_session, sample_event_with_guests):
+    """Only the first check-in flips the flag"""
+    guest = GuestRepo.find_by_name_sql(db_session, sample_event_with_guests.id, "bob johnson")
+    
+    assert GuestRepo.set_checked_in_sql(db_session, guest.id)
+    assert not GuestRepo.set_checked_in_sql(db_session, guest.id)
+    
+    db_session.refresh(guest)
+    assert guest.checked_in
+
+def test_timestamps_are_utc(db_session, sample_event_with_guests):
+    """Timestamps come from the database clock in UTC on every dialect"""
+    guest = GuestRepo.find_by_name_sql(db_session, sample_event_with_guests.id, "bob johnson")
+    GuestRepo.set_checked_in_sql(db_session, guest.id)
+    db_session.refresh(guest)
+    
+    assert abs((guest.updated_at - datetime.utcnow()).total_seconds()) < 60
+    assert str(select(utcnow()).compile(dialect=postgresql.dialect())) == (
+        "SELECT TIMEZONE('utc', CURRENT_TIMESTAMP) AS anon_1"
+    )
+
+def test_event_guest_counters(db_session, sample_event_with_guests):
+    """Event counters follow guest inserts, check-ins and deletes"""
+    event = db_session.get(Event, sample_event_with_guests.id)
+    assert (event.total_guests, event.checked_in_count) == (4, 1)
+    
+    bob = GuestRepo.find_by_name_sql(db_session, event.id, "bob johnson")
+    GuestRepo.set_checked_in_sql(db_session, bob.id)
+    db_session.refresh(event)
+    assert event.checked_in_count == 2
+    
+    jane = GuestRepo.find_by_name_sql(db_session, event.id, "jane smith")
+    jane.checked_in = False
+    db_session.delete(bob)
+    db_session.commit()
+    db_session.refresh(event)
+    assert (event.total_guests, event.checked_in_count) == (3, 0)
+
+def test_event_counters_on_expired_guest(db_session, sample_event_with_guests):
+    """Reassigning checked_in on an expired guest applies only the real change"""
+    event = db_session.get(Event, sample_event_with_guests.id)
+    jane = GuestRepo.find_by_name_sql(db_session, event.id, "jane smith")
+    db_session.commit()  # expires jane, so checked_in is unloaded
+    
+    jane.checked_in = True
+    db_session.commit()
+    assert (event.total_guests, event.checked_in_count) == (4, 1)
+    
+    jane.checked_in = False
+    db_session.commit()
+    assert (event.total_guests, event.checked_in_count) == (4, 0)
+
+def test_find_by_name_prefers_prefix_match(db_session, sample_event_with_guests):
+    """Names starting with the query win over earlier substring matches"""
+    event = sample_event_with_guests
+    db_session.add(Guest(event_id=event.id, name="Bob Smithers", table_name="B1", seat_no=2, dietary="none"))
+    db_session.add(Guest(event_id=event.id, name="Smith Carter", table_name="B1", seat_no=3, dietary="none"))
+    db_session.commit()
+    
+    # Jane Smith has the lowest id containing "smith", but Smith Carter starts with it
+    assert GuestRepo.find_by_name_sql(db_session, event.id, "smith").name == "Smith Carter"
+    # Falls back to a substring match, ignoring surrounding quotes and spaces
+    assert GuestRepo.find_by_name_sql(db_session, event.id, ' "ohnson" ').name == "Bob Johnson"
+
+def test_find_by_name_prefers_exact_match(db_session, sample_event_with_guests):
+    """A guest named exactly as typed wins over earlier guests sharing the prefix"""
+    event = sample_event_with_guests
+    db_session.add(Guest(event_id=event.id, name="John", table_name="B1", seat_no=2, dietary="none"))
+    db_session.commit()
+    
+    assert GuestRepo.find_by_name_sql(db_session, event.id, "JOHN").name == "John"
+    guest, mates = GuestRepo.find_with_table_mates_sql(db_session, event.id, "john")
+    assert guest.name == "John"
+    assert [mate.name for mate in mates] == ["Alice Brown"]
@@ -2,34 +2,20 @@
 Tests for seating service functionality
 """
 
+import json
 import pytest
 from datetime import datetime
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import update
 
-from app.core.db import Base
 from app.models import Event, Guest, Table
+from app.services.repositories import EventRepo, GuestRepo
 from app.services.seating_service import SeatingService
+from tests.conftest import insert_guests, open_session
 
-# Test database setup
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test_seating.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-@pytest.fixture
-def db_session():
-    """Create test database session"""
-    Base.metadata.create_all(bind=engine)
-    db = TestingSessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-        Base.metadata.drop_all(bind=engine)
-
-@pytest.fixture
-def complex_event(db_session):
-    """Create a complex event with multiple tables and guests"""
+@pytest.fixture(scope="module")
+def complex_event(db_connection):
+    """Create a complex event with multiple tables and guests once for the module"""
+    db_session = open_session(db_connection)
     # Create event
     event = Event(
         name="Large Wedding",
@@ -64,19 +50,20 @@ def complex_event(db_session):
         {"name": "VIP Sarah", "table": "VIP1", "seat": 4, "dietary": "halal", "checked_in": False},
     ]
     
-    for guest_data in guests_data:
-        guest = Guest(
-            event_id=event.id,
-            name=guest_data["name"],
-            table_name=guest_data["table"],
-            seat_no=guest_data["seat"],
-            dietary=guest_data["dietary"],
-            checked_in=guest_data["checked_in"]
-        )
-        db_session.add(guest)
+    insert_guests(db_session, event.id, [
+        {
+            "name": guest_data["name"],
+            "table_name": guest_data["table"],
+            "seat_no": guest_data["seat"],
+            "dietary": guest_data["dietary"],
+            "checked_in": guest_data["checked_in"]
+        }
+        for guest_data in guests_data
+    ])
     
     db_session.commit()
     db_session.refresh(event)
+    db_session.close()
     return event
 
 def test_complex_seating_summary(db_session, complex_event):
@@ -90,7 +77,7 @@ def test_complex_seating_summary(db_session, complex_event):
     assert summary is not None
     assert summary["total_guests"] == 33  # 11 + 12 + 6 + 4
     assert summary["total_tables"] == 4  # A1, A2, B1, VIP1 (B2 has no guests)
-    assert summary["checked_in_guests"] == 17  # 5 + 8 + 3 + 2 - 1 (VIP Sarah not checked in)
+    assert summary["checked_in_guests"] == 18  # 5 + 8 + 3 + 2 (VIP Robert and Sarah not checked in)
     
     # Check individual table stats
     tables = {table["table_name"]: table for table in summary["tables"]}
@@ -110,7 +97,65 @@ def test_complex_seating_summary(db_session, complex_event):
     assert tables["VIP1"]["checked_in"] == 2
     assert tables["VIP1"]["available_seats"] == 8
 
-def test_who_sits_with_whom(db_session, complex_event):
+def test_seating_summary_cache_follows_guest_changes(db_session, complex_event):
+    """Guest writes retire the per-table snapshot; the next read rebuilds it"""
+    SeatingService.get_seating_summary("LARGE123", db_session)
+    event = db_session.get(Event, complex_event.id)
+    assert event.tables_cache["version"] == event.tables_version
+    
+    # Core UPDATE path: the check-in bumps the version, leaving the snapshot stale
+    robert = db_session.query(Guest).filter(Guest.name == "VIP Robert").one()
+    assert GuestRepo.set_checked_in_sql(db_session, robert.id)
+    db_session.refresh(event)
+    assert event.tables_cache["version"] != event.tables_version
+    summary = SeatingService.get_seating_summary("LARGE123", db_session)
+    tables = {table["table_name"]: table for table in summary["tables"]}
+    assert summary["checked_in_guests"] == 19
+    assert tables["VIP1"]["checked_in"] == 3
+    
+    # ORM path: moving a guest bumps it through the flush hook
+    sarah = db_session.query(Guest).filter(Guest.name == "VIP Sarah").one()
+    sarah.table_name = "B2"
+    db_session.commit()
+    summary = SeatingService.get_seating_summary("LARGE123", db_session)
+    tables = {table["table_name"]: table for table in summary["tables"]}
+    assert tables["VIP1"]["total_guests"] == 3
+    assert tables["B2"]["total_guests"] == 1
+
+def test_stale_snapshot_is_not_stored(db_session, complex_event):
+    """A snapshot built before a concurrent write lands on no row"""
+    _, version = EventRepo.get_tables_cache_sql(db_session, complex_event.id)
+    tables = EventRepo.summarize_tables_sql(db_session, complex_event.id)
+    
+    # A write commits between the rebuild's reads and its store
+    db_session.execute(
+        update(Event).where(Event.id == complex_event.id).values(tables_version=Event.tables_version + 1)
+    )
+    EventRepo.set_tables_cache_sql(db_session, complex_event.id, version, tables)
+    
+    assert EventRepo.get_tables_cache_sql(db_session, complex_event.id) == (None, version + 1)
+
+def test_streamed_summary_matches_full_summary(db_session, db_connection, complex_event):
+    """The streamed named summary parses to the same data as the built one"""
+    stream_sessions = []
+    
+    def session_factory():
+        stream_sessions.append(open_session(db_connection))
+        return stream_sessions[-1]
+    
+    # The route's session is closed before the body is sent
+    request_db = open_session(db_connection)
+    chunks = SeatingService.stream_seating_summary("LARGE123", request_db, session_factory)
+    request_db.close()
+    body = json.loads(b"".join(chunks))
+    
+    assert body["success"]
+    assert [table["table_name"] for table in body["data"]["tables"]] == ["A1", "A2", "B1", "VIP1"]
+    assert body["data"] == SeatingService.get_seating_summary("LARGE123", db_session, include_names=True)
+    assert len(stream_sessions) == 1 and not stream_sessions[0].in_transaction()
+    assert SeatingService.stream_seating_summary("MISSING", db_session) is None
+
+def test_who_sits_with_whom(db_session, complex_event, sql_counter):
     """Test detailed who-sits-with-whom functionality"""
     # Test A1 table guest
     seating_info = SeatingService.get_guest_seating_info(
@@ -119,6 +164,8 @@ def test_who_sits_with_whom(db_session, complex_event):
         db=db_session
     )
     
+    # Event lookup plus one query for the guest and all their table mates
+    assert len(sql_counter) <= 2
     assert seating_info is not None
     assert len(seating_info.table_mates) == 10  # 11 total - 1 (self)
     
@@ -136,7 +183,7 @@ def test_who_sits_with_whom(db_session, complex_event):
     assert len(checked_in_mates) == 4  # Guests 1,2,3,4 (excluding self which is guest 5)
     assert len(not_checked_in_mates) == 6  # Guests 6,7,8,9,10,11
 
-def test_vip_table_seating(db_session, complex_event):
+def test_vip_table_seating(db_session, complex_event, sql_counter):
     """Test VIP table specific scenarios"""
     seating_info = SeatingService.get_guest_seating_info(
         public_code="LARGE123",
@@ -144,6 +191,7 @@ def test_vip_table_seating(db_session, complex_event):
         db=db_session
     )
     
+    assert len(sql_counter) <= 2
     assert seating_info is not None
     assert seating_info.table_name == "VIP1"
     assert seating_info.seat_no == 1
@@ -151,17 +199,15 @@ def test_vip_table_seating(db_session, complex_event):
     assert seating_info.checked_in == True
     
     # Check VIP table mates
-    table_mates = seating_info.table_mates
+    table_mates = {mate["name"]: mate for mate in seating_info.table_mates}
     assert len(table_mates) == 3  # VIP Mary, Robert, Sarah
     
     # Verify specific dietary preferences are preserved
-    mary = next((mate for mate in table_mates if mate["name"] == "VIP Mary"), None)
-    assert mary is not None
+    mary = table_mates["VIP Mary"]
     assert mary["dietary"] == "vegetarian"
     assert mary["checked_in"] == True
     
-    sarah = next((mate for mate in table_mates if mate["name"] == "VIP Sarah"), None)
-    assert sarah is not None
+    sarah = table_mates["VIP Sarah"]
     assert sarah["dietary"] == "halal"
     assert sarah["checked_in"] == False
 
@@ -249,31 +295,28 @@ def test_seat_ordering(db_session, complex_event):
     
     # Verify guests are ordered by seat number
     for i in range(len(guests) - 1):
-        assert guests[i]["seat_no"] < guests[i + 1]["seat_no"]
+        assert guests[i].seat_no < guests[i + 1].seat_no
     
     # Verify we have all expected seats
-    seat_numbers = [guest["seat_no"] for guest in guests]
+    seat_numbers = [guest.seat_no for guest in guests]
     assert seat_numbers == list(range(1, 12))  # 1 through 11
 
-def test_case_insensitive_guest_search(db_session, complex_event):
+@pytest.mark.parametrize("search_term", [
+    "vip john",      # lowercase
+    "VIP JOHN",      # uppercase
+    "Vip John",      # proper case
+    "vIP jOHn",      # mixed case
+    "vip",           # partial match
+    "john"           # partial match
+])
+def test_case_insensitive_guest_search(db_session, complex_event, search_term):
     """Test case-insensitive guest name search"""
-    # Test various case combinations
-    test_cases = [
-        "vip john",      # lowercase
-        "VIP JOHN",      # uppercase
-        "Vip John",      # proper case
-        "vIP jOHn",      # mixed case
-        "vip",           # partial match
-        "john"           # partial match
-    ]
+    seating_info = SeatingService.get_guest_seating_info(
+        public_code="LARGE123",
+        guest_name=search_term,
+        db=db_session
+    )
     
-    for search_term in test_cases:
-        seating_info = SeatingService.get_guest_seating_info(
-            public_code="LARGE123",
-            guest_name=search_term,
-            db=db_session
-        )
-        
-        assert seating_info is not None
-        assert seating_info.guest_name == "VIP John"
-        assert seating_info.table_name == "VIP1"
+    assert seating_info is not None
+    assert seating_info.guest_name == "VIP John"
+    assert seating_info.table_name == "VIP1"
@@ -0,0 +1,87 @@
+"""
+Tests for WebSocket broadcast fan-out
+"""
+
+import asyncio
+
+from app.api.ws import SEND_QUEUE_SIZE, WebSocketManager
+
+class FakeWebSocket:
+    """Records frames; optionally never finishes sending"""
+
+    def __init__(self, stalled: bool = False):
+        self.stalled = stalled
+        self.sent = []
+        self.closed = False
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, payload: str):
+        if self.stalled:
+            await asyncio.Event().wait()
+        self.sent.append(payload)
+
+    async def close(self, code: int = 1000, reason: str = ""):
+        self.closed = True
+
+def test_broadcast_reaches_every_client():
+    """Each client in the room receives the broadcast once"""
+    async def scenario():
+        manager = WebSocketManager()
+        clients = [FakeWebSocket(), FakeWebSocket()]
+        for client in clients:
+            await manager.connect(client, "EVT")
+
+        await manager.broadcast_to_event("EVT", {"type": "seating_update"})
+        await asyncio.sleep(0)
+
+        assert all(client.sent == ['{"type":"seating_update"}'] for client in clients)
+
+        for client in clients:
+            manager.disconnect(client, "EVT")
+        assert "EVT" not in manager.active_connections
+
+    asyncio.run(scenario())
+
+def test_slow_client_is_dropped():
+    """A client that stops reading is disconnected without blocking the others"""
+    async def scenario():
+        manager = WebSocketManager()
+        fast, slow = FakeWebSocket(), FakeWebSocket(stalled=True)
+        await manager.connect(fast, "EVT")
+        await manager.connect(slow, "EVT")
+
+        # One frame is held by the stalled writer, the rest fill its queue
+        for i in range(SEND_QUEUE_SIZE + 2):
+            await manager.broadcast_to_event("EVT", {"n": i})
+            await asyncio.sleep(0)
+        await asyncio.sleep(0)
+
+        assert manager.active_connections["EVT"] == {fast}
+        assert slow.closed
+        assert len(fast.sent) == SEND_QUEUE_SIZE + 2
+
+        manager.disconnect(fast, "EVT")
+
+    asyncio.run(scenario())
+
+def test_personal_message_goes_through_writer():
+    """A personal frame reaches only its client and is forgotten after disconnect"""
+    async def scenario():
+        manager = WebSocketManager()
+        target, other = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(target, "EVT")
+        await manager.connect(other, "OTHER")
+
+        await manager.send_personal_message({"type": "pong"}, target)
+        await asyncio.sleep(0)
+
+        assert target.sent == ['{"type":"pong"}']
+        assert other.sent == []
+
+        manager.disconnect(target, "EVT")
+        manager.disconnect(other, "OTHER")
+        assert not manager._rooms
+
+    asyncio.run(scenario())